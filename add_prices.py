@@ -1,35 +1,24 @@
-from app import app, db, DeliveryCompany, DeliveryPrice
-
-wilayas = [
-    'أدرار', 'الشلف', 'الأغواط', 'أم البواقي', 'باتنة', 'بجاية', 'بسكرة', 'بشار', 'البليدة', 'البويرة',
-    'تمنراست', 'تبسة', 'تلمسان', 'تيارت', 'تيزي وزو', 'الجزائر', 'الجلفة', 'جيجل', 'سطيف', 'سعيدة',
-    'سكيكدة', 'سيدي بلعباس', 'عنابة', 'قالمة', 'قسنطينة', 'المدية', 'مستغانم', 'المسيلة', 'معسكر', 'ورقلة',
-    'وهران', 'البيض', 'إليزي', 'برج بوعريريج', 'بومرداس', 'الطارف', 'تندوف', 'تيسمسيلت', 'الوادي', 'خنشلة',
-    'سوق أهراس', 'تيبازة', 'ميلة', 'عين الدفلى', 'النعامة', 'عين تموشنت', 'غرداية', 'غليزان',
-    'المغير', 'المنيعة', 'أولاد جلال', 'برج باجي مختار', 'بني عباس', 'تيميمون', 'تقرت', 'جانت',
-    'عين صالح', 'عين قزام', 'تسابيت'
-]
+from app import app, db, Company, DeliveryPrice, upsert_delivery_prices, price_matrix
+from wilayas import WILAYAS
 
 with app.app_context():
     # Get ZR Express company
-    company = DeliveryCompany.query.filter_by(name='zr_express').first()
+    company = Company.query.filter_by(name='zr_express').first()
     if company:
         # Delete existing prices for ZR Express
-        DeliveryPrice.query.filter_by(delivery_company_id=company.id).delete()
+        DeliveryPrice.query.filter_by(company_id=company.id).delete()
         
-        # Add default prices for all wilayas
+        # Add default prices for all wilayas in one batch
         # Using 500 DA for home delivery and 400 DA for office delivery as example prices
-        for wilaya in wilayas:
-            price = DeliveryPrice(
-                delivery_company_id=company.id,
-                wilaya=wilaya,
-                home_delivery_price=500,  # Default home delivery price
-                office_delivery_price=400  # Default office delivery price
-            )
-            db.session.add(price)
+        rows = [
+            {'company_id': company.id, 'wilaya_code': code, 'home': 500, 'office': 400}
+            for code, _, _ in WILAYAS
+        ]
         
         try:
+            upsert_delivery_prices(db.session.connection(), rows)
             db.session.commit()
+            price_matrix.invalidate()
             print("Successfully added prices for all wilayas for ZR Express")
         except Exception as e:
             db.session.rollback()
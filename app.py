@@ -1,16 +1,41 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, abort, stream_with_context, \
+    session, make_response, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from sqlalchemy import create_engine, tuple_, func, case, event, inspect, select, bindparam, literal
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta, date
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import shutil
 import json
+import re
+import sqlite3
+import unicodedata
 from werkzeug.utils import secure_filename
 import time
+import search_index
+import backup_io
+import order_import
+import order_export
+import thumbnails
+from price_matrix import PriceMatrix
+from wilayas import WILAYAS, ALGERIA_WILAYAS
+from identity_cache import IdentityCache
+from autocomplete import Autocomplete
+from metrics import Registry, QueryTracker, COUNT_BUCKETS, top_statements
+from sqlite_profile import sqlite_pragmas, apply_pragmas, engine_options
+import click
+from carriers import StatusCache, StatusJob, refresh_statuses
+from functools import partial, wraps
+from types import SimpleNamespace
+from poller import RateLimiter, StatusPoller, jittered
+import atexit
+import uuid
 
 basedir = os.path.abspath(os.path.dirname(__file__))
-db_path = os.path.join(basedir, 'orders.db')
+db_path = os.environ.get('ORDERS_DB', os.path.join(basedir, 'orders.db'))  # ORDERS_DB لقاعدة بيانات أخرى (مثلاً للقياس)
 
 # إنشاء مجلد النسخ الاحتياطي إذا لم يكن موجوداً
 BACKUP_FOLDER = os.path.join(basedir, 'backups')
@@ -21,6 +46,10 @@ if not os.path.exists(BACKUP_FOLDER):
 UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+# النسخ المصغرة (أسماؤها فيها بصمة المحتوى)
+THUMBNAIL_FOLDER = os.path.join(UPLOAD_FOLDER, 'thumbs')
+if not os.path.exists(THUMBNAIL_FOLDER):
+    os.makedirs(THUMBNAIL_FOLDER)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dkjf84nf7@3nf83#nf8'  # More secure secret key
@@ -28,128 +57,385 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=31)  # Session lasts f
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['THUMBNAIL_FOLDER'] = THUMBNAIL_FOLDER
+app.config['THUMBNAIL_MAX_AGE'] = int(os.environ.get('THUMBNAIL_MAX_AGE', 365 * 24 * 3600))  # بالثواني
+app.config['ORDERS_PER_PAGE'] = int(os.environ.get('ORDERS_PER_PAGE', 50))  # عدد الطلبيات في كل صفحة
+app.config['ORDERS_MAX_PER_PAGE'] = 500
+app.config['BACKUP_COMPRESSION'] = os.environ.get('BACKUP_COMPRESSION', 'gzip')  # gzip أو zstd
+app.config['BACKUP_CHUNK_SIZE'] = 1000  # عدد الصفوف المقروءة في كل دفعة
+app.config['IMPORT_BATCH_SIZE'] = 1000  # عدد الصفوف في كل معاملة عند استيراد الطلبيات
+app.config['EXPORT_CHUNK_SIZE'] = 1000  # عدد الطلبيات المقروءة في كل دفعة عند التصدير
+app.config['RESTORE_BATCH_SIZE'] = 5000  # عدد الصفوف في كل إدخال جماعي عند الاستعادة
+app.config['SNAPSHOT_PAGES_PER_STEP'] = 256  # صفحات قاعدة البيانات المنسوخة في كل خطوة
+app.config['SNAPSHOT_STEP_PAUSE'] = 0.005  # توقف بين الخطوات (بالثواني) لإتاحة الكتابة
+app.config['CARRIER_MAX_WORKERS'] = int(os.environ.get('CARRIER_MAX_WORKERS', 16))  # عدد الاستعلامات المتزامنة لشركات التوصيل
+app.config['CARRIER_REFRESH_TIMEOUT'] = float(os.environ.get('CARRIER_REFRESH_TIMEOUT', 20))  # بالثواني
+# ذاكرة مؤقتة لحالات شركات التوصيل (بالثواني)
+app.config['STATUS_CACHE_TTL'] = int(os.environ.get('STATUS_CACHE_TTL', 600))
+app.config['STATUS_CACHE_HOT_TTL'] = int(os.environ.get('STATUS_CACHE_HOT_TTL', 60))
+app.config['STATUS_CACHE_HOT_WINDOW'] = int(os.environ.get('STATUS_CACHE_HOT_WINDOW', 6 * 3600))
+app.config['STATUS_CACHE_SIZE'] = int(os.environ.get('STATUS_CACHE_SIZE', 50000))
+# التحقق من الحالات في الخلفية: off (داخل الطلب)، thread (داخل العملية)، worker (python poller.py)
+app.config['STATUS_POLLER'] = os.environ.get('STATUS_POLLER', 'off')
+app.config['STATUS_POLL_INTERVAL'] = int(os.environ.get('STATUS_POLL_INTERVAL', 3600))  # بالثواني
+app.config['STATUS_POLL_HOT_INTERVAL'] = int(os.environ.get('STATUS_POLL_HOT_INTERVAL', 600))
+app.config['STATUS_POLL_MAX_BACKOFF'] = int(os.environ.get('STATUS_POLL_MAX_BACKOFF', 6 * 3600))
+app.config['STATUS_POLL_JITTER'] = 0.2
+app.config['STATUS_POLL_LEASE'] = 300  # مدة حجز الطلبيات أثناء المعالجة
+app.config['STATUS_POLL_BATCH'] = int(os.environ.get('STATUS_POLL_BATCH', 100))
+app.config['STATUS_POLL_IDLE'] = int(os.environ.get('STATUS_POLL_IDLE', 30))
+# عدد الاستعلامات في الثانية المسموح بها لكل شركة
+app.config['CARRIER_RATE_LIMITS'] = {'yalidin': 5, 'zr_express': 5}
+# إعدادات SQLite (راجع sqlite_profile.py)؛ SQLITE_PROFILE=default لإعدادات SQLite الافتراضية
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+app.config['SQLITE_PRAGMAS'] = sqlite_pragmas(app.config['SQLITE_PROFILE'], **{
+    name: os.environ[f'SQLITE_{name.upper()}']
+    for name in ('busy_timeout', 'synchronous', 'mmap_size', 'cache_size')
+    if f'SQLITE_{name.upper()}' in os.environ
+})
+# ذاكرة مؤقتة لبيانات المستخدمين (load_user)؛ الملف المشترك يبلغ العمال الآخرين بالتعديلات
+app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 300))
+app.config['IDENTITY_CACHE_SIZE'] = 10000
+app.config['IDENTITY_CACHE_STAMP'] = os.environ.get('IDENTITY_CACHE_STAMP', db_path + '-identity')
+# ملف مشترك يتغير بعد كل حفظ للأسعار؛ مصفوفة الأسعار في كل عامل تقارنه بدلاً من قراءة رقم الإصدار
+app.config['PRICES_STAMP'] = os.environ.get('PRICES_STAMP', db_path + '-prices')
+# فهرس اقتراح الزبائن في الذاكرة: يعاد بناؤه بعد هذه المدة (ليرى تعديلات العمال الآخرين)
+app.config['AUTOCOMPLETE_TTL'] = int(os.environ.get('AUTOCOMPLETE_TTL', 300))
+app.config['AUTOCOMPLETE_MAX_USERS'] = int(os.environ.get('AUTOCOMPLETE_MAX_USERS', 100))
+# جزء ثابت في ETag يتغير مع كل نشر (تاريخ تعديل app.py) حتى لا تبقى صفحات القوالب القديمة
+app.config['ETAG_SALT'] = os.environ.get('ETAG_SALT', str(int(os.path.getmtime(__file__))))
+# المقاييس على /metrics بصيغة Prometheus (METRICS_ENABLED=0 لتعطيلها)
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+# Authorization: Bearer <token>؛ بدونه يعرض المسار للطلبات المحلية فقط (127.0.0.1 بدون وكيل)
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# تسجيل الطلبات الأبطأ من هذا الحد مع أبطأ استعلاماتها (0 = معطل)
+app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 0))
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 5))  # اتصالات لكل عملية
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+    app.config['SQLITE_PRAGMAS'], pool_size=app.config['SQLITE_POOL_SIZE']
+)
 db = SQLAlchemy(app)
 
+with app.app_context():
+    db_engine = db.engine
+
+@event.listens_for(db_engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    apply_pragmas(dbapi_connection, app.config['SQLITE_PRAGMAS'])
+
+# الاتصالات المفتوحة قبل fork (gunicorn --preload) لا تستعمل في العمليات الفرعية
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=lambda: db_engine.dispose(close=False))
+
+# المقاييس
+metrics = Registry(enabled=app.config['METRICS_ENABLED'])
+request_duration = metrics.histogram('request_duration_seconds', 'Request duration by endpoint')
+request_statements = metrics.histogram('request_sql_statements', 'SQL statements per request', COUNT_BUCKETS)
+request_sql_duration = metrics.histogram('request_sql_duration_seconds', 'Time spent in SQL per request')
+sql_statements = metrics.counter('sql_statements_total', 'SQL statements executed (requests and background jobs)')
+slow_requests = metrics.counter('slow_requests_total', 'Requests slower than SLOW_REQUEST_MS')
+carrier_duration = metrics.histogram('carrier_request_duration_seconds', 'Carrier API call duration')
+carrier_errors = metrics.counter('carrier_errors_total', 'Failed carrier API calls')
+backup_duration = metrics.histogram('backup_duration_seconds', 'Backup, snapshot and restore duration')
+query_tracker = QueryTracker(keep_statements=app.config['SLOW_REQUEST_MS'] > 0)
+
+if app.config['METRICS_ENABLED'] or app.config['SLOW_REQUEST_MS']:
+    @event.listens_for(db_engine, 'before_cursor_execute')
+    def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+    
+    @event.listens_for(db_engine, 'after_cursor_execute')
+    def stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['statement_started'].pop()
+        sql_statements.inc()
+        query_tracker.record(statement, duration)
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        query_tracker.start()
+    
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        stats = query_tracker.stop()
+        if started is None or stats is None:
+            return response
+        duration = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        request_duration.observe(duration, endpoint=endpoint, method=request.method, status=str(response.status_code))
+        request_statements.observe(stats['count'], endpoint=endpoint)
+        request_sql_duration.observe(stats['duration'], endpoint=endpoint)
+        
+        slow_ms = app.config['SLOW_REQUEST_MS']
+        if slow_ms and duration * 1000 >= slow_ms:
+            slow_requests.inc(endpoint=endpoint)
+            queries = ''.join(
+                f'\n  {total * 1000:.1f}ms x{count}: {" ".join(statement.split())[:300]}'
+                for total, count, statement in top_statements(stats)
+            )
+            app.logger.warning('Slow request %s %s: %.0fms, %d SQL statements (%.0fms)%s',
+                               request.method, request.path, duration * 1000,
+                               stats['count'], stats['duration'] * 1000, queries)
+        return response
+
 # إعداد نظام تسجيل الدخول
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Algerian States List
-ALGERIAN_STATES = [
-    'Adrar', 'Chlef', 'Laghouat', 'Oum El Bouaghi', 'Batna', 'Béjaïa', 'Biskra',
-    'Béchar', 'Blida', 'Bouira', 'Tamanrasset', 'Tébessa', 'Tlemcen', 'Tiaret',
-    'Tizi Ouzou', 'Alger', 'Djelfa', 'Jijel', 'Sétif', 'Saïda', 'Skikda',
-    'Sidi Bel Abbès', 'Annaba', 'Guelma', 'Constantine', 'Médéa', 'Mostaganem',
-    "M'Sila", 'Mascara', 'Ouargla', 'Oran', 'El Bayadh', 'Illizi', 'Bordj Bou Arréridj',
-    'Boumerdès', 'El Tarf', 'Tindouf', 'Tissemsilt', 'El Oued', 'Khenchela',
-    'Souk Ahras', 'Tipaza', 'Mila', 'Aïn Defla', 'Naâma', 'Aïn Témouchent',
-    'Ghardaïa', 'Relizane'
-]
-
-# دالة لتحويل البيانات إلى JSON
-def serialize_data():
-    data = {
-        'users': [],
-        'orders': []
-    }
-    
-    # حفظ بيانات المستخدمين
-    users = User.query.all()
-    for user in users:
-        user_data = {
-            'id': user.id,
-            'username': user.username,
-            'password': user.password
-        }
-        data['users'].append(user_data)
-    
-    # حفظ بيانات الطلبيات
-    orders = Order.query.all()
-    for order in orders:
-        order_data = {
-            'id': order.id,
-            'user_id': order.user_id,
-            'customer_name': order.customer_name,
-            'customer_phone': order.customer_phone,
-            'customer_state': order.customer_state,
-            'customer_address': order.customer_address,
-            'product_type': order.product_type,
-            'price': order.price,
-            'delivery_type': order.delivery_type,
-            'delivery_company': order.delivery_company,
-            'status': order.status,
-            'created_at': order.created_at.isoformat()
-        }
-        data['orders'].append(order_data)
-    
-    return data
+# Algerian States List (الأسماء اللاتينية حسب رقم الولاية، من wilayas.WILAYAS)
+ALGERIAN_STATES = [name_fr for _, _, name_fr in WILAYAS]
 
-# دالة لاستعادة البيانات من JSON
-def deserialize_data(data):
-    db.drop_all()
-    db.create_all()
+# دالة لحفظ كل الجداول في ملف نسخة احتياطية (JSON سطري مضغوط)
+@backup_duration.timed(operation='serialize')
+def serialize_data(filepath):
+    """كتابة النسخة الاحتياطية صفاً بصف؛ يعيد عدد الصفوف لكل جدول"""
+    with db.engine.connect() as connection:
+        return backup_io.export_backup(connection, db.metadata, filepath, app.config['BACKUP_CHUNK_SIZE'])
+
+def new_backup_path(prefix, timestamp):
+    filename = f'{prefix}_{timestamp}{backup_io.backup_extension(app.config["BACKUP_COMPRESSION"])}'
+    return os.path.join(BACKUP_FOLDER, filename)
+
+@backup_duration.timed(operation='snapshot')
+def snapshot_db(filename):
+    """نسخة متسقة من orders.db أثناء عمل التطبيق، مع تسجيل حجمها ومدتها في snapshots.jsonl"""
+    stats = backup_io.snapshot_database(
+        db_path, os.path.join(BACKUP_FOLDER, filename),
+        pages=app.config['SNAPSHOT_PAGES_PER_STEP'],
+        pause=app.config['SNAPSHOT_STEP_PAUSE']
+    )
+    record = dict(stats, filename=filename, created_at=datetime.now().isoformat())
+    with open(os.path.join(BACKUP_FOLDER, 'snapshots.jsonl'), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    app.logger.info('Database snapshot %s: %d bytes in %.2fs', filename, stats['size'], stats['duration'])
+    return stats
+
+# دالة لاستعادة البيانات من ملف نسخة احتياطية
+@backup_duration.timed(operation='restore')
+def deserialize_data(filepath, batch_size=None):
+    """استعادة النسخة في قاعدة بيانات مؤقتة ثم استبدال orders.db بها دفعة واحدة
     
-    # استعادة بيانات المستخدمين
-    for user_data in data['users']:
-        user = User(
-            id=user_data['id'],
-            username=user_data['username'],
-            password=user_data['password']
-        )
-        db.session.add(user)
+    الملف يقرأ سطراً بسطر والصفوف تدخل على دفعات (executemany). إذا فشلت أي خطوة
+    تبقى قاعدة البيانات الحالية كما هي. يعيد {'rows', 'duration', 'rows_per_second'}.
+    """
+    batch_size = batch_size or app.config['RESTORE_BATCH_SIZE']
+    started = time.perf_counter()
+    staging_path = db_path + '.restore'
+    if os.path.exists(staging_path):
+        os.remove(staging_path)
     
-    # استعادة بيانات الطلبيات
-    for order_data in data['orders']:
-        order = Order(
-            id=order_data['id'],
-            user_id=order_data['user_id'],
-            customer_name=order_data['customer_name'],
-            customer_phone=order_data['customer_phone'],
-            customer_state=order_data['customer_state'],
-            customer_address=order_data['customer_address'],
-            product_type=order_data['product_type'],
-            price=order_data['price'],
-            delivery_type=order_data['delivery_type'],
-            delivery_company=order_data.get('delivery_company'),
-            status=order_data['status'],
-            created_at=datetime.fromisoformat(order_data['created_at'])
-        )
-        db.session.add(order)
+    staging = create_engine(f'sqlite:///{staging_path}')
+    rows = 0
+    try:
+        db.metadata.create_all(staging)
+        tables = {table.name: table for table in db.metadata.sorted_tables}
+        with staging.begin() as connection:
+            # قاعدة مؤقتة: لا حاجة للـ journal أثناء التحميل
+            connection.exec_driver_sql('PRAGMA journal_mode=OFF')
+            connection.exec_driver_sql('PRAGMA synchronous=OFF')
+            
+            batch, batch_table = [], None
+            for table_name, row in backup_io.iter_backup_records(filepath):
+                table = tables.get(table_name)
+                if table is None:
+                    continue
+                if table is not batch_table or len(batch) >= batch_size:
+                    if batch:
+                        connection.execute(batch_table.insert(), batch)
+                        rows += len(batch)
+                    batch, batch_table = [], table
+                batch.append(backup_io.decode_row(table, row, complete=True))
+            if batch:
+                connection.execute(batch_table.insert(), batch)
+                rows += len(batch)
+            
+            # البيانات المشتقة تعاد من الطلبيات
+            rebuild_derived_data(connection)
+        
+        with staging.connect() as connection:
+            result = connection.exec_driver_sql('PRAGMA quick_check').scalar()
+            if result != 'ok':
+                raise RuntimeError(f'فشل فحص سلامة قاعدة البيانات المستعادة: {result}')
+        
+        # أرقام الإصدار في النسخة أقدم من الحالية: تتقدم حتى ترفض الصفحات المحفوظة في المتصفح
+        with staging.begin() as connection:
+            advance_data_versions(connection, {
+                scope: version for scope, (version, _) in read_data_versions().items()
+            })
+    except Exception:
+        staging.dispose()
+        os.remove(staging_path)
+        raise
+    staging.dispose()
     
-    db.session.commit()
+    # الاستبدال: نسخ القاعدة المؤقتة فوق orders.db في خطوة واحدة (ذرية بالنسبة للاتصالات الأخرى)
+    db.session.remove()
+    source = sqlite3.connect(staging_path)
+    target = sqlite3.connect(db_path, timeout=30)
+    try:
+        source.backup(target, pages=-1)
+    finally:
+        source.close()
+        target.close()
+        os.remove(staging_path)
+    db.engine.dispose()
+    # المستخدمون والأسعار تغيروا مع القاعدة
+    identity_cache.invalidate()
+    price_matrix.invalidate()
+    autocomplete.invalidate()
+    
+    duration = time.perf_counter() - started
+    return {'rows': rows, 'duration': duration, 'rows_per_second': rows / duration if duration else rows}
+
+# بيانات المستخدمين في الذاكرة حتى لا يقرأ صف المستخدم في كل طلب
+identity_cache = IdentityCache(
+    ttl=app.config['IDENTITY_CACHE_TTL'],
+    max_entries=app.config['IDENTITY_CACHE_SIZE'],
+    stamp_path=app.config['IDENTITY_CACHE_STAMP']
+)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    values = identity_cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            identity_cache.put(user_id, {column.key: getattr(user, column.key) for column in User.__table__.columns})
+        return user
+    # كائن مرتبط بالجلسة بدون استعلام (merge مع load=False)؛ التعديلات عليه تحفظ عادياً
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(120), nullable=False)
     profile_image = db.Column(db.String(200), default='default.png')
+    # {حجم: {امتداد: اسم الملف}} في THUMBNAIL_FOLDER؛ فارغ حتى تجهز النسخ
+    thumbnails = db.Column(db.JSON(none_as_null=True))
     orders = db.relationship('Order', backref='user', lazy=True)
 
+# قيم الحالة ونوع التوصيل بترتيب أرقامها في قاعدة البيانات (1، 2، 3)؛ تضاف القيم الجديدة في آخر القائمة فقط
+ORDER_STATUSES = ('pending', 'processing', 'delivered', 'returned')
+DELIVERY_TYPES = ('home', 'office', 'free')
+
+# حالات نهائية لا يتم الاستعلام عنها لدى شركة التوصيل
+TERMINAL_STATUSES = ('delivered', 'returned')
+
+class SmallEnum(db.TypeDecorator):
+    """قيمة من قائمة قصيرة تحفظ كرقم صغير وتقرأ كنص: بقية الكود يتعامل مع النصوص فقط"""
+    impl = db.SmallInteger
+    cache_ok = True
+    
+    def __init__(self, values):
+        super().__init__()
+        self.values = tuple(values)
+        self.codes = {value: code for code, value in enumerate(self.values, 1)}
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.codes[value]
+        except KeyError:
+            raise ValueError(f'قيمة غير معروفة: {value!r}') from None
+    
+    # القيم الحرفية (شروط الفهارس الجزئية) تكتب كأرقام أيضاً
+    process_literal_param = process_bind_param
+    
+    def process_result_value(self, value, dialect):
+        return self.values[value - 1] if value is not None else None
+    
+    @property
+    def python_type(self):
+        return str
+    
+    def check(self, column):
+        return f'{column} BETWEEN 1 AND {len(self.values)}'
+
+class Wilaya(db.Model):
+    """جدول الولايات المرجعي: الطلبيات والأسعار تشير إليه برقم الولاية"""
+    __tablename__ = 'wilaya'
+    
+    code = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name_ar = db.Column(db.String(50), nullable=False)
+    name_fr = db.Column(db.String(50), nullable=False)
+
+class Customer(db.Model):
+    """زبائن كل تاجر، واحد لكل رقم هاتف موحد، مع ملخص طلبياته (يحدث مع كل تعديل على الطلبيات)"""
+    __tablename__ = 'customer'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    # الاسم والعنوان من آخر طلبية
+    name = db.Column(db.String(100))
+    wilaya_code = db.Column(db.SmallInteger, db.ForeignKey('wilaya.code'))
+    address = db.Column(db.String(200))
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    delivered_count = db.Column(db.Integer, nullable=False, default=0)
+    returned_count = db.Column(db.Integer, nullable=False, default=0)
+    # مجموع أسعار الطلبيات المسلمة
+    lifetime_value = db.Column(db.Float, nullable=False, default=0.0)
+    first_order_at = db.Column(db.DateTime)
+    last_order_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ux_customer_user_phone', 'user_id', 'phone', unique=True),
+    )
+
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
     customer_name = db.Column(db.String(100), nullable=False)
     customer_phone = db.Column(db.String(20), nullable=False)
     customer_state = db.Column(db.String(50), nullable=False)
+    # رقم الولاية يحسب من customer_state عند الحفظ (customer_state للعرض فقط)
+    wilaya_code = db.Column(db.SmallInteger, db.ForeignKey('wilaya.code'))
     customer_address = db.Column(db.String(200), nullable=False)
     product_type = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
-    delivery_type = db.Column(db.String(20), nullable=False)  # 'office', 'home', 'free'
+    delivery_type = db.Column(SmallEnum(DELIVERY_TYPES), nullable=False)
     delivery_company = db.Column(db.String(50))  # 'yalidin', 'zr_express'
-    status = db.Column(db.String(50), default='pending')  # pending, processing, delivered
+    status = db.Column(SmallEnum(ORDER_STATUSES), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.CheckConstraint(SmallEnum(ORDER_STATUSES).check('status'), name='ck_order_status'),
+        db.CheckConstraint(SmallEnum(DELIVERY_TYPES).check('delivery_type'), name='ck_order_delivery_type'),
+        # فهرس مركب لترقيم الصفحات بالمؤشر: تكلفة الصفحة N مثل تكلفة الصفحة الأولى
+        db.Index('ix_order_user_created_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_order_user_wilaya', 'user_id', 'wilaya_code'),
+        # سجل طلبيات الزبون بنفس ترتيب ترقيم الصفحات
+        db.Index('ix_order_customer_created_id', 'customer_id', 'created_at', 'id'),
+    )
+
+# الطلبيات غير المسلمة. القيم تكتب حرفياً في SQL (literal_execute) لأن SQLite لا يستعمل
+# الفهرس الجزئي إلا إذا تطابق شرط الاستعلام حرفياً مع شرط الفهرس
+ACTIVE_ORDER = Order.status.notin_(
+    bindparam('terminal_statuses', TERMINAL_STATUSES, type_=Order.status.type, expanding=True, literal_execute=True)
+)
+
+# فهرس جزئي صغير لما هو قيد التوصيل فقط (قوائم الحالات، التحقق من شركات التوصيل)
+db.Index('ix_order_active', Order.user_id, Order.status, Order.created_at, Order.id, sqlite_where=ACTIVE_ORDER)
+
 class Company(db.Model):
     __tablename__ = 'company'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     image = db.Column(db.String(200))
+    thumbnails = db.Column(db.JSON(none_as_null=True))
+    # بيانات API (Yalidin: api_id/api_token، ZR Express: token/cle)
+    api_id = db.Column(db.String(100))
+    api_token = db.Column(db.String(100))
+    token = db.Column(db.String(100))
+    cle = db.Column(db.String(100))
     prices = db.relationship('DeliveryPrice', back_populates='company')
 
 class DeliveryPrice(db.Model):
@@ -158,16 +444,954 @@ class DeliveryPrice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     wilaya = db.Column(db.String(100), nullable=False)
+    wilaya_code = db.Column(db.SmallInteger, db.ForeignKey('wilaya.code'))
     home_delivery_price = db.Column(db.Float, default=0.0)
     office_delivery_price = db.Column(db.Float, default=0.0)
     
     company = db.relationship("Company", back_populates="prices")
+    
+    __table_args__ = (
+        # سعر واحد لكل شركة وولاية (مطلوب لـ INSERT ... ON CONFLICT)
+        db.Index('ux_delivery_prices_company_wilaya_code', 'company_id', 'wilaya_code', unique=True),
+        db.Index('ix_delivery_prices_wilaya_code', 'wilaya_code'),
+    )
+
+class StatusPoll(db.Model):
+    """قائمة انتظار التحقق من الحالات: طلب واحد لكل طلبية قيد التوصيل"""
+    __tablename__ = 'status_poll'
+    
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), primary_key=True)
+    carrier = db.Column(db.String(50), nullable=False)
+    next_poll_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_polled_at = db.Column(db.DateTime)
+    last_status_change_at = db.Column(db.DateTime)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(200))
+    lease_owner = db.Column(db.String(32), index=True)
+
+class DailyRevenue(db.Model):
+    """ملخص يومي للطلبيات لكل مستخدم حسب الحالة ونوع التوصيل"""
+    __tablename__ = 'daily_revenue'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(SmallEnum(ORDER_STATUSES), primary_key=True, autoincrement=False)
+    delivery_type = db.Column(SmallEnum(DELIVERY_TYPES), primary_key=True, autoincrement=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class DataVersion(db.Model):
+    """رقم إصدار يزداد مع كل تعديل لمجموعة بيانات (مثلاً 'prices')"""
+    __tablename__ = 'data_versions'
+    
+    scope = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+def bump_data_version(connection, scope):
+    """زيادة رقم الإصدار داخل نفس المعاملة وإرجاع الرقم الجديد"""
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    stmt = sqlite_insert(table).values(scope=scope, version=1, updated_at=now)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.scope],
+        set_={'version': table.c.version + 1, 'updated_at': now}
+    ))
+    return connection.execute(select(table.c.version).where(table.c.scope == scope)).scalar()
+
+def get_data_version(scope):
+    version = db.session.get(DataVersion, scope)
+    return version.version if version else 0
+
+def order_scope(user_id):
+    """رقم إصدار طلبيات كل مستخدم (الطلبيات والملخص اليومي والزبائن تتغير معها)"""
+    return f'orders:{user_id}'
+
+def user_scope(user_id):
+    """رقم إصدار بيانات المستخدم نفسه (الاسم والصورة تظهر في كل صفحة)"""
+    return f'user:{user_id}'
+
+def read_data_versions(scopes=None):
+    """{scope: (version, updated_at)} باتصال مباشر بدون جلسة ORM"""
+    table = DataVersion.__table__
+    query = select(table.c.scope, table.c.version, table.c.updated_at)
+    if scopes is not None:
+        query = query.where(table.c.scope.in_(scopes))
+    with db.engine.connect() as connection:
+        return {row.scope: (row.version, row.updated_at) for row in connection.execute(query)}
+
+def advance_data_versions(connection, previous):
+    """بعد الاستعادة: كل رقم يتجاوز القديم (previous) والمستعاد معاً، حتى لا يطابق ETag قديم بيانات أخرى"""
+    table = DataVersion.__table__
+    restored = dict(connection.execute(select(table.c.scope, table.c.version)).all())
+    now = datetime.utcnow()
+    rows = [
+        {'scope': scope, 'version': max(previous.get(scope, 0), restored.get(scope, 0)) + 1, 'updated_at': now}
+        for scope in previous.keys() | restored.keys()
+    ]
+    if rows:
+        stmt = sqlite_insert(table)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.scope],
+            set_={'version': stmt.excluded.version, 'updated_at': stmt.excluded.updated_at}
+        ), rows)
+
+@event.listens_for(Session, 'after_flush')
+def bump_order_versions(session, flush_context):
+    """رقم إصدار جديد لكل مستخدم أضيفت أو عدلت أو حذفت طلبياته في هذه الدفعة"""
+    user_ids = {
+        obj.user_id for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Order) and (obj not in session.dirty or session.is_modified(obj))
+    }
+    for user_id in sorted(user_ids):
+        bump_data_version(session.connection(), order_scope(user_id))
+
+# الحقول التي تؤثر على الملخص اليومي
+ROLLUP_FIELDS = ('user_id', 'created_at', 'status', 'delivery_type', 'price')
+
+def _rollup_key(values):
+    created_at = values['created_at'] or datetime.utcnow()
+    return (values['user_id'], created_at.date(), values['status'] or 'pending', values['delivery_type'])
+
+def _old_values(order):
+    """قيم الطلب كما هي في قاعدة البيانات قبل التعديل"""
+    state = inspect(order)
+    values = {}
+    for field in ROLLUP_FIELDS:
+        history = state.attrs[field].history
+        values[field] = history.deleted[0] if history.deleted else getattr(order, field)
+    return values
+
+def _new_values(order):
+    return {field: getattr(order, field) for field in ROLLUP_FIELDS}
+
+def add_revenue_delta(deltas, values, sign):
+    key = _rollup_key(values)
+    count, amount = deltas.get(key, (0, 0.0))
+    deltas[key] = (count + sign, amount + sign * float(values['price'] or 0))
+
+def apply_revenue_deltas(connection, deltas):
+    """إضافة الفروقات إلى الملخص اليومي داخل نفس المعاملة"""
+    rows = [
+        {'user_id': user_id, 'day': day, 'status': status, 'delivery_type': delivery_type,
+         'order_count': count, 'revenue': amount}
+        for (user_id, day, status, delivery_type), (count, amount) in deltas.items()
+        if count or amount
+    ]
+    if not rows:
+        return
+    table = DailyRevenue.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day, table.c.status, table.c.delivery_type],
+        set_={
+            'order_count': table.c.order_count + stmt.excluded.order_count,
+            'revenue': table.c.revenue + stmt.excluded.revenue
+        }
+    )
+    connection.execute(stmt, rows)
+
+@event.listens_for(Session, 'after_flush')
+def update_daily_revenue(session, flush_context):
+    """تحديث الملخص اليومي لكل طلب أضيف أو عدل أو حذف في هذه الدفعة"""
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Order):
+            add_revenue_delta(deltas, _new_values(obj), 1)
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj):
+            old_values, new_values = _old_values(obj), _new_values(obj)
+            if old_values != new_values:
+                add_revenue_delta(deltas, old_values, -1)
+                add_revenue_delta(deltas, new_values, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            add_revenue_delta(deltas, _old_values(obj), -1)
+    apply_revenue_deltas(session.connection(), deltas)
+
+def rebuild_daily_revenue(user_id=None, connection=None):
+    """إعادة بناء الملخص اليومي من جدول الطلبيات (للتعبئة الأولى أو الإصلاح)"""
+    session_connection = connection is None
+    connection = connection or db.session.connection()
+    table = DailyRevenue.__table__
+    delete = table.delete()
+    orders = db.session.query(
+        Order.user_id,
+        func.date(Order.created_at),
+        func.coalesce(Order.status, 'pending'),
+        Order.delivery_type,
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.price), 0)
+    ).group_by(Order.user_id, func.date(Order.created_at), func.coalesce(Order.status, 'pending'), Order.delivery_type)
+    if user_id is not None:
+        delete = delete.where(table.c.user_id == user_id)
+        orders = orders.filter(Order.user_id == user_id)
+    
+    connection.execute(delete)
+    connection.execute(table.insert().from_select(
+        ['user_id', 'day', 'status', 'delivery_type', 'order_count', 'revenue'],
+        orders.statement
+    ))
+    if session_connection:
+        db.session.commit()
+
+@event.listens_for(Order, 'before_insert')
+@event.listens_for(Order, 'before_update')
+def set_order_wilaya_code(mapper, connection, order):
+    order.wilaya_code = wilaya_code(order.customer_state)
+
+@event.listens_for(Order, 'after_insert')
+def index_new_order(mapper, connection, order):
+    search_index.index_order(connection, order.id, order.user_id, _search_values(order))
+
+@event.listens_for(Order, 'after_update')
+def reindex_order(mapper, connection, order):
+    state = inspect(order)
+    if any(state.attrs[field].history.has_changes() for field in search_index.SEARCH_FIELDS + ('user_id',)):
+        search_index.index_order(connection, order.id, order.user_id, _search_values(order))
+
+@event.listens_for(Order, 'after_delete')
+def unindex_order(mapper, connection, order):
+    search_index.remove_order(connection, order.id)
+
+def needs_polling(order):
+    return bool(order.delivery_company) and order.status not in TERMINAL_STATUSES
+
+def schedule_polls(connection, orders):
+    """إضافة الطلبيات إلى قائمة التحقق (مستحقة الآن) أو حذفها منها إذا لم تعد بحاجة للتحقق
+    
+    orders: أي كائنات لها id و delivery_company و status (طلبيات ORM أو صفوف)
+    """
+    table = StatusPoll.__table__
+    remove = [order.id for order in orders if not needs_polling(order)]
+    if remove:
+        connection.execute(table.delete().where(table.c.order_id.in_(remove)))
+    
+    now = datetime.utcnow()
+    rows = [
+        {'order_id': order.id, 'carrier': order.delivery_company, 'next_poll_at': now,
+         'last_status_change_at': now, 'failures': 0}
+        for order in orders if needs_polling(order)
+    ]
+    if rows:
+        stmt = sqlite_insert(table)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.order_id],
+            set_={'carrier': stmt.excluded.carrier, 'next_poll_at': stmt.excluded.next_poll_at,
+                  'last_status_change_at': stmt.excluded.last_status_change_at}
+        ), rows)
+
+def schedule_poll(connection, order):
+    schedule_polls(connection, [order])
+
+@event.listens_for(Order, 'after_insert')
+def enqueue_new_order(mapper, connection, order):
+    if needs_polling(order):
+        schedule_poll(connection, order)
+
+@event.listens_for(Order, 'after_update')
+def reschedule_order(mapper, connection, order):
+    state = inspect(order)
+    if state.attrs.status.history.has_changes() or state.attrs.delivery_company.history.has_changes():
+        schedule_poll(connection, order)
+
+@event.listens_for(Order, 'after_delete')
+def dequeue_order(mapper, connection, order):
+    connection.execute(StatusPoll.__table__.delete().where(StatusPoll.order_id == order.id))
+
+# حقول الطلب المنسوخة في جدول الزبائن
+CUSTOMER_FIELDS = ('customer_phone', 'customer_name', 'customer_state', 'customer_address')
+CUSTOMER_CHUNK_SIZE = 500
+# أعمدة الملخص في جدول الزبائن (تحسب من الطلبيات)
+CUSTOMER_TOTALS = ('order_count', 'delivered_count', 'returned_count', 'lifetime_value', 'first_order_at', 'last_order_at')
+
+def customer_phone(phone):
+    """رقم الهاتف الموحد الذي يعرف الزبون، أو None إذا لم يكن رقماً جزائرياً صحيحاً"""
+    phone = order_import.normalize_phone(phone)
+    return phone if is_valid_algerian_phone(phone) else None
+
+def customer_row(user_id, phone, values):
+    return {
+        'user_id': user_id,
+        'phone': phone,
+        'name': values['customer_name'],
+        'wilaya_code': wilaya_code(values['customer_state']),
+        'address': values['customer_address']
+    }
+
+def upsert_customers(connection, rows, update=True):
+    """إنشاء الزبائن الجدد وإرجاع {(user_id, phone): id}
+    
+    rows: [{'user_id', 'phone', 'name', 'wilaya_code', 'address'}]؛ مع update=True يأخذ الزبون
+    الموجود الاسم والعنوان الجديدين (آخر طلبية).
+    """
+    if not rows:
+        return {}
+    table = Customer.__table__
+    stmt = sqlite_insert(table)
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.phone],
+            set_={'name': stmt.excluded.name, 'wilaya_code': stmt.excluded.wilaya_code, 'address': stmt.excluded.address}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.phone])
+    connection.execute(stmt, rows)
+    
+    phones = {}
+    for row in rows:
+        phones.setdefault(row['user_id'], set()).add(row['phone'])
+    ids = {}
+    for user_id, user_phones in phones.items():
+        user_phones = list(user_phones)
+        for start in range(0, len(user_phones), CUSTOMER_CHUNK_SIZE):
+            result = connection.execute(select(table.c.id, table.c.phone).where(
+                table.c.user_id == user_id, table.c.phone.in_(user_phones[start:start + CUSTOMER_CHUNK_SIZE])
+            ))
+            ids.update(((user_id, phone), customer_id) for customer_id, phone in result)
+    return ids
+
+def refresh_customers(connection, customer_ids=None):
+    """إعادة حساب ملخص الزبائن من طلبياتهم (عبر فهرس customer_id)؛ كل الزبائن إذا لم تحدد القائمة
+    
+    SQLAlchemy 1.4 لا يدعم UPDATE ... FROM في SQLite: المجاميع تقرأ باستعلام GROUP BY واحد ثم
+    تكتب بأمر UPDATE واحد (executemany).
+    """
+    table = Customer.__table__
+    orders = Order.__table__
+    delivered = orders.c.status == 'delivered'
+    totals = select(
+        orders.c.customer_id,
+        func.count().label('order_count'),
+        func.sum(case((delivered, 1), else_=0)).label('delivered_count'),
+        func.sum(case((orders.c.status == 'returned', 1), else_=0)).label('returned_count'),
+        func.sum(case((delivered, orders.c.price), else_=0.0)).label('lifetime_value'),
+        func.min(orders.c.created_at).label('first_order_at'),
+        func.max(orders.c.created_at).label('last_order_at')
+    ).where(orders.c.customer_id.isnot(None)).group_by(orders.c.customer_id)
+    update = table.update().where(table.c.id == bindparam('b_id')).values(
+        {name: bindparam(f'b_{name}') for name in CUSTOMER_TOTALS}
+    )
+    # زبون حذفت كل طلبياته لا يظهر في totals
+    zero = {'order_count': 0, 'delivered_count': 0, 'returned_count': 0, 'lifetime_value': 0.0,
+            'first_order_at': None, 'last_order_at': None}
+    
+    def params(customer_id, row):
+        return {'b_id': customer_id, **{f'b_{name}': row[name] for name in CUSTOMER_TOTALS}}
+    
+    if customer_ids is None:
+        connection.execute(table.update().values(zero))
+        result = connection.execution_options(stream_results=True).execute(totals)
+        for rows in result.mappings().partitions(CUSTOMER_CHUNK_SIZE):
+            connection.execute(update, [params(row['customer_id'], row) for row in rows])
+        return
+    
+    customer_ids = list(customer_ids)
+    for start in range(0, len(customer_ids), CUSTOMER_CHUNK_SIZE):
+        chunk = customer_ids[start:start + CUSTOMER_CHUNK_SIZE]
+        found = {row['customer_id']: row for row in connection.execute(
+            totals.where(orders.c.customer_id.in_(chunk))
+        ).mappings()}
+        connection.execute(update, [
+            params(customer_id, found.get(customer_id, zero)) for customer_id in chunk
+        ])
+
+def link_customer(connection, order):
+    phone = customer_phone(order.customer_phone)
+    if not phone:
+        order.customer_id = None
+        return
+    ids = upsert_customers(connection, [customer_row(order.user_id, phone, {field: getattr(order, field) for field in CUSTOMER_FIELDS})])
+    order.customer_id = ids[(order.user_id, phone)]
+
+@event.listens_for(Order, 'before_insert')
+def link_new_order_customer(mapper, connection, order):
+    link_customer(connection, order)
+
+@event.listens_for(Order, 'before_update')
+def relink_order_customer(mapper, connection, order):
+    state = inspect(order)
+    if any(state.attrs[field].history.has_changes() for field in CUSTOMER_FIELDS):
+        link_customer(connection, order)
+
+@event.listens_for(Session, 'after_flush')
+def update_customer_stats(session, flush_context):
+    """إعادة حساب ملخص الزبائن الذين تغيرت طلبياتهم في هذه الدفعة (القديم والجديد عند تغيير الهاتف)"""
+    customer_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Order):
+            customer_ids.update(inspect(obj).attrs.customer_id.history.sum())
+    customer_ids.discard(None)
+    if customer_ids:
+        refresh_customers(session.connection(), customer_ids)
+
+def backfill_customers(connection):
+    """ربط الطلبيات التي ليس لها زبون (بيانات قديمة أو إدخال جماعي) وإنشاء الزبائن
+    
+    قراءة واحدة مرتبة للطلبيات غير المربوطة (آخر طلبية تعطي الاسم والعنوان)، ثم جدول مؤقت
+    (الهاتف كما هو مكتوب -> الزبون) وتحديث واحد لكل الطلبيات، ثم إعادة حساب ملخص كل الزبائن.
+    يعيد عدد الزبائن المعنيين.
+    """
+    orders = Order.__table__
+    result = connection.execution_options(stream_results=True).execute(
+        select(orders.c.user_id, orders.c.customer_phone, orders.c.customer_name,
+               orders.c.customer_state, orders.c.customer_address)
+        .where(orders.c.customer_id.is_(None)).order_by(orders.c.id)
+    )
+    customers = {}
+    raw_phones = {}
+    for user_id, raw_phone, name, state, address in result:
+        phone = customer_phone(raw_phone)
+        if phone:
+            customers[(user_id, phone)] = customer_row(user_id, phone, {
+                'customer_name': name, 'customer_state': state, 'customer_address': address
+            })
+            raw_phones[(user_id, raw_phone)] = phone
+    if not customers:
+        return 0
+    
+    ids = upsert_customers(connection, list(customers.values()), update=False)
+    connection.exec_driver_sql(
+        'CREATE TEMP TABLE IF NOT EXISTS customer_phone_map '
+        '(user_id INTEGER, phone TEXT, customer_id INTEGER, PRIMARY KEY (user_id, phone))'
+    )
+    connection.exec_driver_sql('DELETE FROM customer_phone_map')
+    connection.execute(db.text('INSERT INTO customer_phone_map VALUES (:user_id, :phone, :customer_id)'), [
+        {'user_id': user_id, 'phone': raw_phone, 'customer_id': ids[(user_id, phone)]}
+        for (user_id, raw_phone), phone in raw_phones.items()
+    ])
+    connection.exec_driver_sql(
+        'UPDATE "order" SET customer_id = (SELECT customer_id FROM customer_phone_map AS m '
+        'WHERE m.user_id = "order".user_id AND m.phone = "order".customer_phone) WHERE customer_id IS NULL'
+    )
+    connection.exec_driver_sql('DROP TABLE customer_phone_map')
+    refresh_customers(connection)
+    return len(ids)
+
+def customer_suggestion(customer):
+    """بيانات الزبون كما ترجع في الاقتراحات (لملء نموذج الطلب)"""
+    code = customer.wilaya_code
+    return {
+        'id': customer.id,
+        'name': customer.name,
+        'phone': customer.phone,
+        'wilaya_code': code,
+        'wilaya': ALGERIA_WILAYAS[code - 1] if code else None,
+        'address': customer.address,
+        'order_count': customer.order_count
+    }
+
+def load_customer_suggestions(user_id):
+    columns = Customer.__table__.c
+    with db.engine.connect() as connection:
+        return [customer_suggestion(row) for row in connection.execute(select(
+            columns.id, columns.name, columns.phone, columns.wilaya_code, columns.address, columns.order_count
+        ).where(columns.user_id == user_id))]
+
+autocomplete = Autocomplete(
+    load_customer_suggestions,
+    ttl=app.config['AUTOCOMPLETE_TTL'],
+    max_users=app.config['AUTOCOMPLETE_MAX_USERS']
+)
+
+def remember_customers(user_id, customer_ids):
+    """تحديث فهرس الاقتراحات بعد تغيير ملخص زبائن (order_count) باستعلام IN واحد"""
+    customer_ids = [customer_id for customer_id in set(customer_ids) if customer_id]
+    if customer_ids:
+        for customer in Customer.query.filter(Customer.id.in_(customer_ids)):
+            autocomplete.put(user_id, customer_suggestion(customer))
+
+def remember_customer(order):
+    """تحديث فهرس الاقتراحات بعد حفظ طلب"""
+    remember_customers(order.user_id, [order.customer_id])
+
+def _search_values(order):
+    return {field: getattr(order, field) for field in search_index.SEARCH_FIELDS}
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """إعادة بناء فهرس البحث النصي: flask --app app rebuild-search"""
+    search_index.rebuild_search_index(db.session.connection())
+    db.session.commit()
+    print('تمت إعادة بناء فهرس البحث')
+
+@app.cli.command('rebuild-revenue')
+def rebuild_revenue_command():
+    """إعادة بناء جدول الملخص اليومي: flask --app app rebuild-revenue"""
+    rebuild_daily_revenue()
+    print('تمت إعادة بناء الملخص اليومي للإيرادات')
+
+def backfill_status_poll(connection=None, after_id=0):
+    """قائمة التحقق من الحالات: كل طلب قيد التوصيل غير موجود فيها يصبح مستحقاً الآن"""
+    session_connection = connection is None
+    connection = connection or db.session.connection()
+    connection.execute(db.text(
+        'INSERT OR IGNORE INTO status_poll (order_id, carrier, next_poll_at, failures) '
+        'SELECT id, delivery_company, :now, 0 FROM "order" '
+        "WHERE id > :after_id AND delivery_company IS NOT NULL AND delivery_company != '' AND status NOT IN :terminal"
+    ).bindparams(bindparam('terminal', expanding=True, type_=Order.status.type)),
+        {'now': datetime.utcnow(), 'after_id': after_id, 'terminal': list(TERMINAL_STATUSES)})
+    if session_connection:
+        db.session.commit()
+
+def rebuild_derived_data(connection):
+    """إعادة بناء الملخص اليومي وفهرس البحث وقائمة التحقق وأرقام الولايات والزبائن بعد تحميل بيانات خام"""
+    seed_wilayas(connection)
+    backfill_wilaya_codes(connection)
+    backfill_customers(connection)
+    rebuild_daily_revenue(connection=connection)
+    search_index.create_search_index(connection)
+    search_index.rebuild_search_index(connection)
+    backfill_status_poll(connection)
+
+def _enum_codes(column, values):
+    """CASE يحول النص القديم إلى رقمه (بدون ELSE: القيم غير المعروفة ترفض قبل النقل)"""
+    whens = ' '.join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values, 1))
+    return f'CASE lower(trim({column})) {whens} END'
+
+def _unknown_enum_values(connection, column, values):
+    """[(القيمة، عدد الطلبيات)] للقيم النصية التي لا تقابل أي رقم (وNULL)"""
+    known = ', '.join(f"'{value}'" for value in values)
+    return connection.exec_driver_sql(
+        f'SELECT {column}, COUNT(*) FROM "order" '
+        f'WHERE {column} IS NULL OR lower(trim({column})) NOT IN ({known}) GROUP BY {column}'
+    ).all()
+
+def convert_enum_columns():
+    """تحويل status وdelivery_type من نص إلى أرقام صغيرة، أو تحديث CHECK بعد إضافة قيمة جديدة
+    
+    SQLite لا يغير نوع عمود ولا يعدل CHECK لجدول موجود: ينشأ جدول الطلبيات من جديد وتنقل
+    الصفوف (بنفس الأرقام) بأمر INSERT ... SELECT واحد، ثم تنشأ الفهارس في upgrade_schema.
+    الملخص اليومي مشتق فيحذف ويعاد بناؤه. يعيد True إذا أعيد إنشاء الجدول.
+    """
+    table = Order.__table__
+    connection = db.session.connection()
+    table_sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order'"
+    ).scalar()
+    checks = [constraint.sqltext.text for constraint in table.constraints if isinstance(constraint, db.CheckConstraint)]
+    if all(check in table_sql for check in checks):
+        return False
+    
+    columns = {column['name']: column['type'] for column in inspect(db.engine).get_columns('order')}
+    enums = {
+        name: values
+        for name, values in (('status', ORDER_STATUSES), ('delivery_type', DELIVERY_TYPES))
+        # عمود رقمي أصلاً (فقط CHECK تغير): ينقل كما هو
+        if not isinstance(columns[name], db.Integer)
+    }
+    # لا نغير بيانات لا نعرف معناها: التوقف مع قائمة القيم حتى تصحح يدوياً أو تضاف إلى القائمة
+    unknown = {
+        name: rows for name, values in enums.items()
+        if (rows := _unknown_enum_values(connection, name, values))
+    }
+    if unknown:
+        details = '؛ '.join(
+            f'{name}: ' + '، '.join(f'{value!r} ({count})' for value, count in rows)
+            for name, rows in unknown.items()
+        )
+        raise RuntimeError(
+            f'قيم غير معروفة في جدول الطلبيات، لم يتم تحويل الجدول: {details}. '
+            'صححها بأمر UPDATE أو أضفها إلى ORDER_STATUSES/DELIVERY_TYPES ثم أعد التشغيل'
+        )
+    
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect))
+    connection.exec_driver_sql('DROP TABLE IF EXISTS order_new')
+    connection.exec_driver_sql(ddl.replace('CREATE TABLE "order"', 'CREATE TABLE order_new', 1))
+    
+    names = [column.name for column in table.columns]
+    values = {name: _enum_codes(name, enum_values) for name, enum_values in enums.items()}
+    connection.exec_driver_sql(
+        f'INSERT INTO order_new ({", ".join(names)}) '
+        f'SELECT {", ".join(values.get(name, name) for name in names)} FROM "order"'
+    )
+    connection.exec_driver_sql('DROP TABLE "order"')
+    connection.exec_driver_sql('ALTER TABLE order_new RENAME TO "order"')
+    
+    DailyRevenue.__table__.drop(connection, checkfirst=True)
+    DailyRevenue.__table__.create(connection)
+    db.session.commit()
+    return True
+
+def upgrade_schema():
+    """إنشاء الأعمدة والفهارس الناقصة في قاعدة بيانات موجودة (create_all لا يعدل الجداول القديمة)"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+    db.session.commit()
+    
+    # الحالة ونوع التوصيل كأرقام مع CHECK (الملخص اليومي يعاد بناؤه في الأسفل)
+    convert_enum_columns()
+    
+    # جدول الولايات وأرقام الولايات للطلبيات والأسعار القديمة
+    connection = db.session.connection()
+    seed_wilayas(connection)
+    backfill_wilaya_codes(connection)
+    
+    # حذف الأسعار المكررة قبل إنشاء الفهرس الفريد (نحتفظ بآخر صف لكل شركة وولاية)
+    db.session.execute(db.text(
+        'DELETE FROM delivery_prices WHERE id NOT IN '
+        '(SELECT MAX(id) FROM delivery_prices GROUP BY company_id, COALESCE(wilaya_code, wilaya))'
+    ))
+    # الفهرس الفريد القديم على النص حل محله الفهرس على رقم الولاية
+    db.session.execute(db.text('DROP INDEX IF EXISTS ux_delivery_prices_company_wilaya'))
+    db.session.commit()
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    
+    # تعبئة الملخص اليومي عند إنشائه لأول مرة على قاعدة بيانات موجودة
+    if not DailyRevenue.query.first() and Order.query.first():
+        rebuild_daily_revenue()
+    
+    backfill_status_poll()
+    
+    # الزبائن: ربط الطلبيات القديمة (أو التي أضيفت بدون زبون)
+    backfill_customers(db.session.connection())
+    db.session.commit()
+    
+    # فهرس البحث النصي (FTS5)
+    connection = db.session.connection()
+    if search_index.create_search_index(connection):
+        search_index.rebuild_search_index(connection)
+    db.session.commit()
+
+def order_to_dict(order):
+    """تحويل الطلب إلى قاموس لإرساله بصيغة JSON"""
+    return {
+        'id': order.id,
+        'customer_id': order.customer_id,
+        'customer_name': order.customer_name,
+        'customer_phone': order.customer_phone,
+        'customer_state': order.customer_state,
+        'wilaya_code': order.wilaya_code,
+        'customer_address': order.customer_address,
+        'product_type': order.product_type,
+        'price': order.price,
+        'delivery_type': order.delivery_type,
+        'delivery_company': order.delivery_company,
+        'status': order.status,
+        'created_at': order.created_at.isoformat() if order.created_at else None
+    }
+
+def encode_cursor(order):
+    """مؤشر الصفحة التالية: تاريخ الإنشاء ورقم آخر طلب في الصفحة"""
+    return f'{order.created_at.isoformat()}~{order.id}'
+
+def decode_cursor(cursor):
+    created_at, order_id = cursor.rsplit('~', 1)
+    return datetime.fromisoformat(created_at), int(order_id)
+
+def get_per_page():
+    """عدد العناصر في الصفحة من الطلب مع حد أقصى"""
+    per_page = request.args.get('per_page', type=int) or app.config['ORDERS_PER_PAGE']
+    return max(1, min(per_page, app.config['ORDERS_MAX_PER_PAGE']))
+
+def paginate_orders(query, cursor=None, per_page=None):
+    """ترقيم الصفحات بالمؤشر (keyset) على (created_at, id) بدلاً من OFFSET"""
+    per_page = per_page or app.config['ORDERS_PER_PAGE']
+    if cursor:
+        try:
+            created_at, order_id = decode_cursor(cursor)
+        except ValueError:
+            created_at, order_id = None, None
+        if created_at is not None:
+            query = query.filter(tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id))
+    
+    # جلب عنصر إضافي لمعرفة وجود صفحة تالية
+    orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor(orders[per_page - 1]) if len(orders) > per_page else None
+    return orders[:per_page], next_cursor
+
+def has_order_filters(filters):
+    """فلاتر لا يعرفها الملخص اليومي (الحالة المركبة، شركة التوصيل، البحث)"""
+    return bool(filters.status or filters.carrier or filters.search)
+
+def revenue_stats(user_id, start_date=None, end_date=None, filters=None):
+    """كل أرقام لوحة الإيرادات من الملخص اليومي: صف لكل يوم بدلاً من صف لكل طلب
+    
+    مع فلاتر غير التاريخ (has_order_filters) تحسب نفس الأرقام من الطلبيات المفلترة نفسها،
+    حتى تطابق القائمة المعروضة.
+    """
+    now = datetime.now()
+    month_start = date(now.year, now.month, 1)
+    next_month = date(now.year + 1, 1, 1) if now.month == 12 else date(now.year, now.month + 1, 1)
+    
+    if filters is not None and has_order_filters(filters):
+        query = filter_orders(Order.query.filter(Order.user_id == user_id), filters)
+        revenue, count, status, delivery_type = Order.price, literal(1), Order.status, Order.delivery_type
+        in_month = (Order.created_at >= datetime.combine(month_start, datetime.min.time())) \
+            & (Order.created_at < datetime.combine(next_month, datetime.min.time()))
+    else:
+        query = daily_revenue_query(user_id, start_date, end_date)
+        revenue, count = DailyRevenue.revenue, DailyRevenue.order_count
+        status, delivery_type = DailyRevenue.status, DailyRevenue.delivery_type
+        in_month = (DailyRevenue.day >= month_start) & (DailyRevenue.day < next_month)
+    
+    def sum_if(condition):
+        return func.coalesce(func.sum(case((condition, revenue), else_=0)), 0)
+    
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, count), else_=0)), 0)
+    
+    row = query.with_entities(
+        func.coalesce(func.sum(revenue), 0).label('total_revenue'),
+        func.coalesce(func.sum(count), 0).label('total_orders'),
+        sum_if(delivery_type == 'home').label('home_delivery'),
+        sum_if(delivery_type == 'office').label('office_delivery'),
+        sum_if(delivery_type == 'free').label('free_delivery'),
+        sum_if(status == 'pending').label('pending_revenue'),
+        sum_if(status == 'processing').label('processing_revenue'),
+        sum_if(status == 'delivered').label('delivered_revenue'),
+        sum_if(status == 'returned').label('returned_revenue'),
+        count_if(status == 'pending').label('pending_orders'),
+        count_if(status == 'processing').label('processing_orders'),
+        count_if(status == 'delivered').label('delivered_orders'),
+        count_if(status == 'returned').label('returned_orders'),
+        sum_if(in_month).label('monthly_revenue')
+    ).one()
+    return dict(row._mapping)
+
+def daily_revenue_query(user_id, start_date=None, end_date=None):
+    query = DailyRevenue.query.filter(DailyRevenue.user_id == user_id)
+    if start_date:
+        query = query.filter(DailyRevenue.day >= start_date.date())
+    if end_date:
+        query = query.filter(DailyRevenue.day <= end_date.date())
+    return query
+
+def search_orders(term, cursor=None, per_page=None):
+    """البحث في فهرس FTS5 مع ترتيب حسب الصلة؛ المؤشر هنا هو الإزاحة في النتائج"""
+    per_page = per_page or app.config['ORDERS_PER_PAGE']
+    offset = int(cursor) if cursor and cursor.isdigit() else 0
+    ids = search_index.search_order_ids(db.session.connection(), current_user.id, term, per_page + 1, offset)
+    next_cursor = str(offset + per_page) if len(ids) > per_page else None
+    ids = ids[:per_page]
+    
+    orders_by_id = {order.id: order for order in Order.query.filter(Order.id.in_(ids))} if ids else {}
+    return [orders_by_id[order_id] for order_id in ids if order_id in orders_by_id], next_cursor
+
+def order_filters():
+    """فلاتر قائمة الطلبيات من الرابط (مشتركة بين track_orders وrevenue والتصدير)
+    
+    search_name، start_date/end_date بصيغة YYYY-MM-DD، status، carrier
+    """
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    status = request.args.get('status')
+    return SimpleNamespace(
+        search=request.args.get('search_name', '').strip(),
+        start_date=datetime.strptime(start_date, '%Y-%m-%d') if start_date else None,
+        # تعيين نهاية اليوم
+        end_date=datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59) if end_date else None,
+        # 'active': كل ما لم يسلم بعد
+        status=status if status in STATUS_TEXT or status == 'active' else None,
+        carrier=request.args.get('carrier') or None
+    )
+
+def filter_orders(query, filters):
+    """تطبيق الفلاتر على استعلام طلبيات المستخدم الحالي (البحث عبر FTS5 إذا كان متوفراً)"""
+    if filters.start_date:
+        query = query.filter(Order.created_at >= filters.start_date)
+    if filters.end_date:
+        query = query.filter(Order.created_at <= filters.end_date)
+    if filters.status == 'active':
+        query = query.filter(ACTIVE_ORDER)
+    elif filters.status:
+        query = query.filter(Order.status == filters.status)
+        if filters.status not in TERMINAL_STATUSES:
+            # شرط زائد منطقياً لكنه يسمح لـ SQLite باستعمال الفهرس الجزئي ix_order_active
+            query = query.filter(ACTIVE_ORDER)
+    if filters.carrier:
+        query = query.filter(Order.delivery_company == filters.carrier)
+    if filters.search:
+        matches = None
+        if search_index.is_available(db.session.connection()):
+            matches = search_index.matching_ids(current_user.id, filters.search)
+        if matches is not None:
+            query = query.filter(Order.id.in_(matches))
+        else:
+            query = query.filter(Order.customer_name.ilike(f'%{filters.search}%'))
+    return query
+
+def wants_json():
+    """طلبات "تحميل المزيد" تأتي عبر AJAX وتنتظر JSON"""
+    return (request.args.get('format') == 'json'
+            or request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+
+def conditional(*scopes, period=None):
+    """ETag وLast-Modified من أرقام إصدار البيانات لصفحات GET التي تحدث تلقائياً
+    
+    scopes: أسماء الإصدارات ('prices' أو '{user_id}' تستبدل برقم المستخدم)، ويضاف إليها دائماً
+    إصدار المستخدم (user_scope). إذا طابق If-None-Match يرجع 304 بعد قراءة بضعة صفوف من
+    data_versions فقط، قبل أي استعلام ORM أو قالب.
+    period: صيغة strftime للصفحات التي تتغير مع التاريخ بدون تعديل البيانات (مثلاً '%Y-%m'
+    لإيرادات الشهر الحالي)؛ قيمتها الآن تضاف إلى ETag.
+    If-Modified-Since وحده لا يكفي (دقته ثانية واحدة) فلا يستعمل للـ 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            
+            names = [user_scope(current_user.id), *(scope.format(user_id=current_user.id) for scope in scopes)]
+            versions = read_data_versions(names)
+            etag = '-'.join([
+                str(current_user.id), 'json' if wants_json() else 'html', app.config['ETAG_SALT'],
+                *(str(versions.get(name, (0, None))[0]) for name in names),
+                *([datetime.now().strftime(period)] if period else [])
+            ])
+            last_modified = max((updated_at for _, updated_at in versions.values()), default=None)
+            
+            # رسالة flash معلقة تظهر مرة واحدة في الصفحة: لا 304، ولا ETag إذا عرضها القالب
+            flashes = '_flashes' in session
+            if not flashes and request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or (flashes and '_flashes' not in session):
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            # المتصفح يحفظ الصفحة لكن يتحقق منها في كل مرة (صفحات خاصة بكل مستخدم)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.update(('Cookie', 'X-Requested-With'))
+            return response
+        return wrapper
+    return decorator
+
+STATUS_TEXT = {
+    'pending': 'قيد الانتظار',
+    'processing': 'قيد المعالجة',
+    'delivered': 'تم التوصيل',
+    'returned': 'مرتجع'
+}
+
+status_cache = StatusCache(
+    ttl=app.config['STATUS_CACHE_TTL'],
+    hot_ttl=app.config['STATUS_CACHE_HOT_TTL'],
+    hot_window=app.config['STATUS_CACHE_HOT_WINDOW'],
+    max_entries=app.config['STATUS_CACHE_SIZE']
+)
+
+PHONE_PATTERN = re.compile(r'^(05|06|07)[0-9]{8}$')
 
 def is_valid_algerian_phone(phone):
     """التحقق من صحة رقم الهاتف الجزائري"""
-    import re
-    pattern = r'^(05|06|07)[0-9]{8}$'
-    return bool(re.match(pattern, phone))
+    return bool(PHONE_PATTERN.match(phone))
+
+_wilaya_lookup = None
+
+def _wilaya_key(value):
+    """مفتاح مقارنة: بدون حركات ولا همزات (Béjaïa = bejaia) ولا فرق بين المسافة و - و '"""
+    value = unicodedata.normalize('NFKD', str(value)).lower()
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return re.sub(r"[\s\-'’]+", ' ', value).strip()
+
+def wilaya_code(value):
+    """رقم الولاية (1..58) من الرقم، "NN - الاسم"، الاسم العربي أو اللاتيني؛ أو None"""
+    global _wilaya_lookup
+    if _wilaya_lookup is None:
+        lookup = {}
+        for code, name_ar, name_fr in WILAYAS:
+            for name in (str(code), f'{code:02d}', f'{code:02d} - {name_ar}', name_ar, name_fr):
+                lookup[_wilaya_key(name)] = code
+        _wilaya_lookup = lookup
+    
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return value if 1 <= value <= len(WILAYAS) else None
+    return _wilaya_lookup.get(_wilaya_key(value or ''))
+
+def resolve_wilaya(value):
+    """الولاية كما تحفظ في الطلب وجدول الأسعار ("NN - الاسم")، أو None"""
+    code = wilaya_code(value)
+    return ALGERIA_WILAYAS[code - 1] if code else None
+
+def seed_wilayas(connection):
+    """تعبئة جدول الولايات (أو تحديث الأسماء) من wilayas.WILAYAS"""
+    table = Wilaya.__table__
+    stmt = sqlite_insert(table)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.code],
+        set_={'name_ar': stmt.excluded.name_ar, 'name_fr': stmt.excluded.name_fr}
+    ), [{'code': code, 'name_ar': name_ar, 'name_fr': name_fr} for code, name_ar, name_fr in WILAYAS])
+
+def backfill_wilaya_codes(connection):
+    """تحويل الولايات المكتوبة نصاً إلى أرقام في الطلبيات والأسعار التي ليس لها رقم بعد
+    
+    تحديث واحد لكل نص مختلف (عشرات فقط) بدل صف بصف؛ النصوص غير المعروفة تبقى بدون رقم،
+    وكذلك سعر مكرر لولاية لها سعر آخر بنفس الرقم (OR IGNORE مع الفهرس الفريد).
+    """
+    for table_name, column in (('order', 'customer_state'), ('delivery_prices', 'wilaya')):
+        values = connection.execute(db.text(
+            f'SELECT DISTINCT {column} FROM "{table_name}" WHERE wilaya_code IS NULL'
+        )).scalars().all()
+        params = [{'code': wilaya_code(value), 'value': value} for value in values if wilaya_code(value)]
+        if params:
+            connection.execute(db.text(
+                f'UPDATE OR IGNORE "{table_name}" SET wilaya_code = :code WHERE {column} = :value AND wilaya_code IS NULL'
+            ), params)
+
+# أسعار التوصيل في الذاكرة (لكل عملية)
+price_matrix = PriceMatrix(stamp_path=app.config['PRICES_STAMP'])
+
+def get_price_matrix():
+    """تحميل المصفوفة عند أول استعمال، وإعادة تحميلها إذا عدلت عملية أخرى الأسعار
+    
+    في كل استدعاء os.stat واحد لملف الختم؛ رقم إصدار 'prices' يقرأ فقط إذا تغير الملف.
+    الختم يتغير بعد commit، فقد يرى عامل آخر السعر القديم في الفترة القصيرة بينهما.
+    """
+    # الختم قبل قاعدة البيانات: تعديل بعد هذه القراءة يغيره مرة أخرى فلا يضيع
+    stamp = price_matrix.read_stamp()
+    if price_matrix.loaded and stamp == price_matrix.stamp:
+        return price_matrix
+    version = read_data_versions(['prices']).get('prices', (0, None))[0]
+    if not price_matrix.loaded or price_matrix.version != version:
+        companies = [
+            (company.id, company.name, company.image, company.thumbnails) for company in Company.query.all()
+        ]
+        prices = [
+            (price.company_id, price.wilaya_code, price.home_delivery_price, price.office_delivery_price)
+            for price in DeliveryPrice.query.all()
+        ]
+        price_matrix.load(companies, prices, version)
+    price_matrix.stamp = stamp
+    return price_matrix
+
+def upsert_delivery_prices(connection, rows):
+    """إدخال/تحديث الأسعار بأمر INSERT ... ON CONFLICT واحد (executemany)
+    
+    rows: [{'company_id', 'wilaya_code', 'home', 'office'}]؛ القيمة None تترك السعر الحالي كما هو
+    (أو 0 إذا كان الصف جديداً). يعيد رقم إصدار الأسعار الجديد.
+    """
+    table = DeliveryPrice.__table__
+    if rows:
+        rows = [dict(row, wilaya=ALGERIA_WILAYAS[row['wilaya_code'] - 1]) for row in rows]
+        stmt = sqlite_insert(table).values(
+            company_id=bindparam('company_id'),
+            wilaya_code=bindparam('wilaya_code'),
+            wilaya=bindparam('wilaya'),
+            home_delivery_price=func.coalesce(bindparam('home'), 0.0),
+            office_delivery_price=func.coalesce(bindparam('office'), 0.0)
+        )
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.company_id, table.c.wilaya_code],
+            set_={
+                'home_delivery_price': func.coalesce(bindparam('home'), table.c.home_delivery_price),
+                'office_delivery_price': func.coalesce(bindparam('office'), table.c.office_delivery_price)
+            }
+        ), rows)
+    return bump_data_version(connection, 'prices')
 
 def check_yalidin_status(tracking_number, api_id, api_token):
     """التحقق من حالة الطلب في Yalidin"""
@@ -177,7 +1401,8 @@ def check_yalidin_status(tracking_number, api_id, api_token):
         statuses = {
             'pending': 'في الانتظار',
             'processing': 'قيد المعالجة',
-            'delivered': 'تم التسليم'
+            'delivered': 'تم التسليم',
+            'returned': 'مرتجع'
         }
         return {'status': 'success', 'delivery_status': 'processing'}
     except Exception as e:
@@ -191,7 +1416,8 @@ def check_zr_express_status(tracking_number, token, cle):
         statuses = {
             'pending': 'في الانتظار',
             'processing': 'جاري التوصيل',
-            'delivered': 'تم التوصيل'
+            'delivered': 'تم التوصيل',
+            'returned': 'مرتجع'
         }
         return {'status': 'success', 'delivery_status': 'processing'}
     except Exception as e:
@@ -247,28 +1473,22 @@ def logout():
     if current_user.username == 'admin':
         try:
             # حفظ البيانات
-            data = serialize_data()
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'backup_auto_{timestamp}.json'
-            filepath = os.path.join(BACKUP_FOLDER, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            serialize_data(new_backup_path('backup_auto', timestamp))
             
             # نسخ قاعدة البيانات
-            db_backup = f'orders_auto_{timestamp}.db'
-            db_backup_path = os.path.join(BACKUP_FOLDER, db_backup)
-            shutil.copy2(db_path, db_backup_path)
+            snapshot_db(f'orders_auto_{timestamp}.db')
             
             # حذف النسخ القديمة (الاحتفاظ بآخر 5 نسخ فقط)
-            auto_backups = [f for f in os.listdir(BACKUP_FOLDER) if f.startswith('backup_auto_')]
+            auto_backups = [f for f in os.listdir(BACKUP_FOLDER)
+                            if f.startswith('backup_auto_') and backup_io.is_backup_file(f)]
             auto_backups.sort(reverse=True)
             
             for old_backup in auto_backups[5:]:  # حذف كل النسخ بعد الخمس نسخ الأحدث
                 old_path = os.path.join(BACKUP_FOLDER, old_backup)
                 os.remove(old_path)
                 # حذف ملف قاعدة البيانات المقابل
-                old_db = old_backup.replace('backup_auto_', 'orders_auto_').replace('.json', '.db')
+                old_db = 'orders_auto_' + old_backup[len('backup_auto_'):].split('.', 1)[0] + '.db'
                 old_db_path = os.path.join(BACKUP_FOLDER, old_db)
                 if os.path.exists(old_db_path):
                     os.remove(old_db_path)
@@ -289,6 +1509,10 @@ def create_order():
         if not is_valid_algerian_phone(phone):
             flash('رقم الهاتف غير صحيح. يجب أن يبدأ بـ 05 أو 06 أو 07 ويتكون من 10 أرقام')
             return redirect(url_for('create_order'))
+        
+        if request.form['delivery_type'] not in DELIVERY_TYPES:
+            flash('نوع التوصيل غير صحيح')
+            return redirect(url_for('create_order'))
             
         order = Order(
             user_id=current_user.id,
@@ -303,77 +1527,298 @@ def create_order():
         )
         db.session.add(order)
         db.session.commit()
+        remember_customer(order)
         flash('تم إنشاء الطلب بنجاح')
         return redirect(url_for('track_orders'))
     return render_template('create_order.html', states=ALGERIAN_STATES)
 
+def insert_orders(user_id, rows):
+    """إدخال دفعة من الطلبيات في معاملة واحدة (executemany بدلاً من كائن ORM لكل طلب)
+    
+    الإدخال الجماعي لا يمر بأحداث ORM، لذلك يحدث الملخص اليومي وفهرس البحث وقائمة
+    التحقق والزبائن هنا مباشرة لنفس الدفعة.
+    """
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    rows = [
+        dict(values, user_id=user_id, status='pending', created_at=now,
+             wilaya_code=wilaya_code(values['customer_state']))
+        for values in rows
+    ]
+    # زبون واحد لكل رقم هاتف في الدفعة (آخر صف يعطي الاسم والعنوان)
+    phones = [customer_phone(values['customer_phone']) for values in rows]
+    customer_ids = upsert_customers(connection, list({
+        phone: customer_row(user_id, phone, values) for phone, values in zip(phones, rows) if phone
+    }.values()))
+    for phone, values in zip(phones, rows):
+        values['customer_id'] = customer_ids.get((user_id, phone))
+    connection.execute(Order.__table__.insert(), rows)
+    
+    # المعاملة تحجز الكتابة منذ الإدخال، فأرقام الدفعة هي آخر len(rows) رقماً
+    last_id = connection.execute(select(func.max(Order.id))).scalar() - len(rows)
+    
+    deltas = {}
+    for values in rows:
+        add_revenue_delta(deltas, values, 1)
+    apply_revenue_deltas(connection, deltas)
+    search_index.index_orders_after(connection, last_id)
+    backfill_status_poll(connection, after_id=last_id)
+    refresh_customers(connection, set(customer_ids.values()))
+    bump_data_version(connection, order_scope(user_id))
+    db.session.commit()
+
+def import_orders_file(user_id, stream, filename):
+    rows = order_import.iter_rows(stream, filename)
+    try:
+        return order_import.import_orders(
+            rows, partial(insert_orders, user_id),
+            is_valid_phone=is_valid_algerian_phone,
+            resolve_wilaya=resolve_wilaya,
+            batch_size=app.config['IMPORT_BATCH_SIZE']
+        )
+    finally:
+        # زبائن جدد كثيرون: إعادة بناء الفهرس عند أول اقتراح أسهل من تحديثه زبوناً زبوناً
+        autocomplete.invalidate(user_id)
+
+@app.route('/import_orders', methods=['POST'])
+@login_required
+def import_orders():
+    """استيراد الطلبيات من ملف CSV أو XLSX مع تقرير بأخطاء كل سطر"""
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'message': 'لم يتم اختيار ملف'})
+    
+    try:
+        report = import_orders_file(current_user.id, file.stream, file.filename)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    return jsonify(dict(report, success=True, message=f'تم استيراد {report["imported"]} طلب'))
+
+@app.cli.command('import-orders')
+@click.argument('path')
+@click.option('--user', 'username', required=True, help='اسم المستخدم صاحب الطلبيات')
+def import_orders_command(path, username):
+    """استيراد الطلبيات من ملف: flask --app app import-orders orders.csv --user NAME"""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException('المستخدم غير موجود')
+    with open(path, 'rb') as stream:
+        report = import_orders_file(user.id, stream, os.path.basename(path))
+    for error in report['errors']:
+        click.echo(f'السطر {error["row"]}: {"، ".join(error["errors"])}')
+    click.echo(f'تم استيراد {report["imported"]} طلب، {report["failed"]} سطر مرفوض')
+
 @app.route('/track_orders', methods=['GET'])
 @login_required
+@conditional(order_scope('{user_id}'))
 def track_orders():
-    search_name = request.args.get('search_name', '').strip()
+    filters = order_filters()
+    cursor = request.args.get('cursor')
+    per_page = get_per_page()
     orders = Order.query.filter_by(user_id=current_user.id)
     
-    if search_name:
-        orders = orders.filter(Order.customer_name.ilike(f'%{search_name}%'))
+    # البحث وحده مرتب حسب الصلة؛ مع فلاتر أخرى تبقى القائمة مرتبة حسب التاريخ
+    search_only = filters.search and not any((filters.start_date, filters.end_date, filters.status, filters.carrier))
+    if search_only and search_index.is_available(db.session.connection()):
+        orders, next_cursor = search_orders(filters.search, cursor, per_page)
+    else:
+        orders, next_cursor = paginate_orders(filter_orders(orders, filters), cursor, per_page)
+    
+    # تحميل المزيد: إرجاع الصفحة التالية فقط
+    if wants_json():
+        return jsonify({
+            'success': True,
+            'orders': [order_to_dict(order) for order in orders],
+            'next_cursor': next_cursor
+        })
     
-    orders = orders.order_by(Order.created_at.desc()).all()
-    return render_template('track_orders.html', orders=orders, search_name=search_name)
+    return render_template('track_orders.html', orders=orders, search_name=filters.search,
+                           filters=filters, next_cursor=next_cursor, per_page=per_page)
 
 @app.route('/revenue', methods=['GET'])
 @login_required
+@conditional(order_scope('{user_id}'), period='%Y-%m')
 def revenue():
+    filters = order_filters()
+    start_date, end_date = filters.start_date, filters.end_date
+    
+    # الحصول على الطلبيات
+    orders_query = filter_orders(Order.query.filter_by(user_id=current_user.id), filters)
+    
+    # حساب الإحصائيات من الملخص اليومي بدلاً من تحميل كل الطلبيات (أو من الطلبيات المفلترة)
+    stats = revenue_stats(current_user.id, start_date, end_date, filters)
+    
+    # قائمة الطلبيات تعرض صفحة بصفحة
+    orders, next_cursor = paginate_orders(orders_query, request.args.get('cursor'), get_per_page())
+    if wants_json():
+        return jsonify({
+            'success': True,
+            'orders': [order_to_dict(order) for order in orders],
+            'next_cursor': next_cursor,
+            'stats': stats
+        })
+    
+    return render_template('revenue.html',
+                         orders=orders,
+                         next_cursor=next_cursor,
+                         **stats,
+                         filters=filters,
+                         start_date=start_date.strftime('%Y-%m-%d') if start_date else '',
+                         end_date=end_date.strftime('%Y-%m-%d') if end_date else '')
+
+@app.route('/export_orders/<file_format>', methods=['GET'])
+@login_required
+def export_orders(file_format):
+    """تصدير الطلبيات بنفس فلاتر track_orders وrevenue، مثلاً:
+    /export_orders/csv?status=delivered&carrier=yalidin&start_date=2024-01-01
+    """
+    if file_format not in order_export.MIMETYPES:
+        abort(404)
+    if file_format == 'xlsx' and not order_export.xlsx_available():
+        return jsonify({'success': False, 'message': 'تصدير XLSX يتطلب مكتبة openpyxl'}), 400
+    
+    filters = order_filters()
+    query = filter_orders(Order.query.filter_by(user_id=current_user.id), filters).with_entities(
+        *(getattr(Order, field) for field in order_export.EXPORT_FIELDS)
+    )
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    
+    def chunks():
+        # دفعات بالمؤشر (created_at, id): كل دفعة استعلام قصير بدون OFFSET
+        last = None
+        while True:
+            chunk = query
+            if last is not None:
+                chunk = chunk.filter(tuple_(Order.created_at, Order.id) < last)
+            rows = chunk.order_by(Order.created_at.desc(), Order.id.desc()).limit(chunk_size).all()
+            # إنهاء معاملة القراءة بين الدفعات حتى لا تبقى مفتوحة طوال التحميل
+            db.session.rollback()
+            if not rows:
+                return
+            last = (rows[-1].created_at, rows[-1].id)
+            yield [
+                (order_id, created_at.strftime('%Y-%m-%d %H:%M') if created_at else '', name, phone, state,
+                 address, product, price, delivery_type, company or '', STATUS_TEXT.get(status, status))
+                for order_id, created_at, name, phone, state, address, product, price, delivery_type, company, status
+                in rows
+            ]
+            if len(rows) < chunk_size:
+                return
+    
+    stream = order_export.iter_xlsx(chunks()) if file_format == 'xlsx' else order_export.iter_csv(chunks())
+    filename = f'orders_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{file_format}'
+    return app.response_class(
+        stream_with_context(stream),
+        mimetype=order_export.MIMETYPES[file_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/revenue/daily', methods=['GET'])
+@login_required
+@conditional(order_scope('{user_id}'))
+def revenue_daily():
+    """تقرير يومي للإيرادات خلال فترة زمنية"""
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+    end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
     
-    # تحويل التواريخ إلى كائنات datetime
-    if start_date:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-    if end_date:
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        # تعيين نهاية اليوم
-        end_date = end_date.replace(hour=23, minute=59, second=59)
+    rows = daily_revenue_query(current_user.id, start_date, end_date).with_entities(
+        DailyRevenue.day,
+        func.sum(DailyRevenue.order_count),
+        func.sum(DailyRevenue.revenue)
+    ).group_by(DailyRevenue.day).order_by(DailyRevenue.day).all()
     
-    # الحصول على الطلبيات
-    orders_query = Order.query.filter_by(user_id=current_user.id)
+    return jsonify({
+        'success': True,
+        'days': [{'day': day.isoformat(), 'orders': count, 'revenue': amount} for day, count, amount in rows]
+    })
+
+@app.route('/revenue/wilayas', methods=['GET'])
+@login_required
+@conditional(order_scope('{user_id}'))
+def revenue_wilayas():
+    """عدد الطلبيات والإيرادات لكل ولاية خلال فترة زمنية (تجميع على رقم الولاية)"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+    end_date = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None
     
+    delivered = Order.status == 'delivered'
+    query = db.session.query(
+        Order.wilaya_code,
+        func.count(Order.id),
+        func.sum(Order.price),
+        func.sum(case((delivered, 1), else_=0)),
+        func.sum(case((delivered, Order.price), else_=0))
+    ).filter(Order.user_id == current_user.id)
     if start_date:
-        orders_query = orders_query.filter(Order.created_at >= start_date)
+        query = query.filter(Order.created_at >= start_date)
     if end_date:
-        orders_query = orders_query.filter(Order.created_at <= end_date)
-    
-    orders = orders_query.order_by(Order.created_at.desc()).all()
-    
-    # حساب الإحصائيات
-    total_revenue = sum(order.price for order in orders)
-    home_delivery = sum(order.price for order in orders if order.delivery_type == 'home')
-    office_delivery = sum(order.price for order in orders if order.delivery_type == 'office')
-    free_delivery = sum(order.price for order in orders if order.delivery_type == 'free')
+        query = query.filter(Order.created_at < end_date)
+    totals = query.group_by(Order.wilaya_code).subquery()
     
-    # حساب الإيرادات حسب الحالة
-    pending_revenue = sum(order.price for order in orders if order.status == 'pending')
-    processing_revenue = sum(order.price for order in orders if order.status == 'processing')
-    delivered_revenue = sum(order.price for order in orders if order.status == 'delivered')
+    rows = db.session.query(totals, Wilaya.name_ar, Wilaya.name_fr).outerjoin(
+        Wilaya, Wilaya.code == totals.c.wilaya_code
+    ).order_by(totals.c.wilaya_code).all()
     
-    # حساب إيرادات الشهر الحالي
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    monthly_orders = [order for order in orders 
-                     if order.created_at.month == current_month 
-                     and order.created_at.year == current_year]
-    monthly_revenue = sum(order.price for order in monthly_orders)
+    return jsonify({
+        'success': True,
+        'wilayas': [
+            {
+                'code': code, 'name_ar': name_ar, 'name_fr': name_fr,
+                'orders': count, 'revenue': amount,
+                'delivered_orders': delivered_count, 'delivered_revenue': delivered_amount
+            }
+            for code, count, amount, delivered_count, delivered_amount, name_ar, name_fr in rows
+        ]
+    })
+
+@app.route('/customers/suggest', methods=['GET'])
+@login_required
+def customer_suggestions():
+    """اقتراح الزبائن أثناء الكتابة: ?q=0555 أو ?q=محمد (من الذاكرة، بدون استعلام)"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify({
+        'success': True,
+        'customers': autocomplete.suggest(current_user.id, request.args.get('q', ''), limit)
+    })
+
+@app.route('/customers/<phone>', methods=['GET'])
+@login_required
+def customer_history(phone):
+    """سجل الزبون برقم هاتفه: الملخص محسوب مسبقاً في جدول الزبائن والطلبيات صفحة بصفحة
+    عبر الفهرس (customer_id, created_at, id)، فالتكلفة لا تتعلق بعدد الطلبيات الكلي"""
+    phone = customer_phone(phone)
+    customer = Customer.query.filter_by(user_id=current_user.id, phone=phone).first() if phone else None
+    if not customer:
+        return jsonify({'success': False, 'message': 'الزبون غير موجود'}), 404
     
-    return render_template('revenue.html',
-                         orders=orders,
-                         total_revenue=total_revenue,
-                         home_delivery=home_delivery,
-                         office_delivery=office_delivery,
-                         free_delivery=free_delivery,
-                         pending_revenue=pending_revenue,
-                         processing_revenue=processing_revenue,
-                         delivered_revenue=delivered_revenue,
-                         monthly_revenue=monthly_revenue,
-                         start_date=start_date.strftime('%Y-%m-%d') if start_date else '',
-                         end_date=end_date.strftime('%Y-%m-%d') if end_date else '')
+    orders, next_cursor = paginate_orders(
+        Order.query.filter(Order.customer_id == customer.id), request.args.get('cursor'), get_per_page()
+    )
+    finished = customer.delivered_count + customer.returned_count
+    return jsonify({
+        'success': True,
+        'customer': {
+            'id': customer.id,
+            'phone': customer.phone,
+            'name': customer.name,
+            'wilaya_code': customer.wilaya_code,
+            'address': customer.address,
+            'order_count': customer.order_count,
+            'delivered_count': customer.delivered_count,
+            'returned_count': customer.returned_count,
+            # نسبة الإرجاع من الطلبيات المنتهية (مسلمة أو مرتجعة)
+            'return_rate': customer.returned_count / finished if finished else 0.0,
+            'lifetime_value': customer.lifetime_value,
+            'first_order_at': customer.first_order_at.isoformat() if customer.first_order_at else None,
+            'last_order_at': customer.last_order_at.isoformat() if customer.last_order_at else None
+        },
+        'orders': [order_to_dict(order) for order in orders],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/backup', methods=['GET', 'POST'])
 @login_required
@@ -384,7 +1829,7 @@ def backup():
     
     backups = []
     for filename in os.listdir(BACKUP_FOLDER):
-        if filename.endswith('.json'):
+        if backup_io.is_backup_file(filename):
             filepath = os.path.join(BACKUP_FOLDER, filename)
             backup_time = datetime.fromtimestamp(os.path.getctime(filepath))
             backups.append({
@@ -398,33 +1843,23 @@ def backup():
         
         if action == 'create':
             # إنشاء نسخة احتياطية جديدة
-            data = serialize_data()
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'backup_{timestamp}.json'
-            filepath = os.path.join(BACKUP_FOLDER, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            serialize_data(new_backup_path('backup', timestamp))
             
             # نسخ ملف قاعدة البيانات
-            db_backup = f'orders_{timestamp}.db'
-            db_backup_path = os.path.join(BACKUP_FOLDER, db_backup)
-            shutil.copy2(db_path, db_backup_path)
+            stats = snapshot_db(f'orders_{timestamp}.db')
             
-            flash('تم إنشاء نسخة احتياطية بنجاح')
+            flash(f'تم إنشاء نسخة احتياطية بنجاح ({stats["size"] // 1024} KB في {stats["duration"]:.2f} ثانية)')
             return redirect(url_for('backup'))
         
         elif action == 'restore':
             # استعادة من نسخة احتياطية
             backup_file = request.form.get('backup_file')
             if backup_file:
-                filepath = os.path.join(BACKUP_FOLDER, backup_file)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
+                filepath = os.path.join(BACKUP_FOLDER, os.path.basename(backup_file))
                 try:
-                    deserialize_data(data)
-                    flash('تم استعادة النسخة الاحتياطية بنجاح')
+                    stats = deserialize_data(filepath)
+                    flash(f'تم استعادة النسخة الاحتياطية بنجاح ({stats["rows"]} صف في {stats["duration"]:.1f} ثانية)')
                 except Exception as e:
                     flash(f'حدث خطأ أثناء استعادة النسخة الاحتياطية: {str(e)}')
             
@@ -458,7 +1893,9 @@ def delivery_companies():
             zr_express.cle = request.form.get('cle')
             db.session.add(zr_express)
         
+        bump_data_version(db.session.connection(), 'prices')
         db.session.commit()
+        price_matrix.invalidate()
         flash('تم تحديث بيانات الشركة بنجاح')
         return redirect(url_for('delivery_companies'))
     
@@ -466,11 +1903,150 @@ def delivery_companies():
 
 @app.route('/delivery_prices')
 @login_required
+@conditional('prices')
 def delivery_prices():
-    from wilayas import ALGERIA_WILAYAS
     companies = Company.query.all()
     return render_template('delivery_prices.html', companies=companies, wilayas=ALGERIA_WILAYAS)
 
+@app.route('/quote', methods=['GET', 'POST'])
+@login_required
+def quote():
+    """أسعار التوصيل من الذاكرة
+    
+    GET ?wilaya=16: أسعار المنزل/المكتب لكل الشركات في الولاية
+    POST {"carts": [{"wilaya": 16, "delivery_type": "home", "subtotal": 2500, "company_id": 1}]}:
+    المجموع لكل سلة (لكل الشركات إذا لم تحدد company_id)
+    """
+    matrix = get_price_matrix()
+    
+    if request.method == 'GET':
+        code = wilaya_code(request.args.get('wilaya'))
+        if not code:
+            return jsonify({'success': False, 'message': 'الولاية غير معروفة'})
+        return jsonify({'success': True, 'wilaya': code, 'quotes': matrix.quote(code)})
+    
+    data = request.get_json(silent=True) or {}
+    totals = []
+    for cart in data.get('carts') or []:
+        code = wilaya_code(cart.get('wilaya'))
+        if not code:
+            totals.append({'success': False, 'message': 'الولاية غير معروفة'})
+            continue
+        try:
+            subtotal = float(cart.get('subtotal') or 0)
+        except (TypeError, ValueError):
+            totals.append({'success': False, 'message': 'المبلغ غير صحيح'})
+            continue
+        
+        delivery_type = cart.get('delivery_type', 'home')
+        company_ids = [cart['company_id']] if cart.get('company_id') is not None else matrix.company_ids()
+        options = []
+        for company_id in company_ids:
+            shipping = matrix.shipping(company_id, code, delivery_type)
+            options.append({
+                'company_id': company_id,
+                'shipping': shipping,
+                'total': subtotal + shipping if shipping is not None else None
+            })
+        totals.append({'success': True, 'wilaya': code, 'options': options})
+    
+    return jsonify({'success': True, 'totals': totals})
+
+def _price_value(value):
+    if value is None or value == '':
+        return None
+    value = float(value)
+    if value < 0:
+        raise ValueError
+    return value
+
+@app.route('/delivery_prices/grid', methods=['GET', 'POST'])
+@login_required
+@conditional('prices')
+def delivery_prices_grid():
+    """جدول الأسعار كاملاً في طلب واحد
+    
+    GET: أسعار كل الشركات مع رقم الإصدار
+    POST {"company_id": 1, "prices": [{"wilaya": 16, "home": 500, "office": 400}, ...]}
+    أو {"companies": [{"company_id": 1, "prices": [...]}, ...]}
+    "version" اختياري: يرفض التعديل (409) إذا تغيرت الأسعار منذ تحميل الجدول.
+    """
+    if request.method == 'GET':
+        companies = {
+            company.id: {'company_id': company.id, 'name': company.name, 'prices': []}
+            for company in Company.query.order_by(Company.id)
+        }
+        for price in DeliveryPrice.query.order_by(DeliveryPrice.company_id, DeliveryPrice.wilaya_code):
+            if price.company_id in companies:
+                companies[price.company_id]['prices'].append({
+                    'id': price.id,
+                    'wilaya': price.wilaya,
+                    'code': price.wilaya_code,
+                    'home': price.home_delivery_price,
+                    'office': price.office_delivery_price
+                })
+        return jsonify({
+            'success': True,
+            'version': get_data_version('prices'),
+            'companies': list(companies.values())
+        })
+    
+    data = request.get_json(silent=True) or {}
+    grids = data.get('companies') or [{'company_id': data.get('company_id'), 'prices': data.get('prices')}]
+    company_ids = {company_id for company_id, in db.session.query(Company.id)}
+    
+    rows = {}
+    errors = []
+    for grid in grids:
+        company_id = grid.get('company_id')
+        if company_id not in company_ids:
+            errors.append({'company_id': company_id, 'message': 'الشركة غير موجودة'})
+            continue
+        for entry in grid.get('prices') or []:
+            code = wilaya_code(entry.get('wilaya'))
+            if not code:
+                errors.append({'company_id': company_id, 'wilaya': entry.get('wilaya'), 'message': 'الولاية غير معروفة'})
+                continue
+            try:
+                home, office = _price_value(entry.get('home')), _price_value(entry.get('office'))
+            except (TypeError, ValueError):
+                errors.append({'company_id': company_id, 'wilaya': entry.get('wilaya'), 'message': 'السعر غير صحيح'})
+                continue
+            # آخر قيمة لنفس الخانة هي المعتمدة
+            rows[(company_id, code)] = {'company_id': company_id, 'wilaya_code': code, 'home': home, 'office': office}
+    
+    if errors:
+        return jsonify({'success': False, 'message': 'بيانات غير صحيحة', 'errors': errors}), 400
+    
+    try:
+        version = upsert_delivery_prices(db.session.connection(), list(rows.values()))
+        expected = data.get('version')
+        if expected is not None and version != int(expected) + 1:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'تم تعديل الأسعار من مكان آخر، أعد تحميل الجدول',
+                'version': version - 1
+            }), 409
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+    
+    # تحديث المصفوفة في الذاكرة بالقيم المحفوظة فعلاً
+    if price_matrix.loaded and rows:
+        updated = DeliveryPrice.query.filter(
+            DeliveryPrice.company_id.in_({company_id for company_id, _ in rows})
+        )
+        for price in updated:
+            price_matrix.set_price(
+                price.company_id, price.wilaya_code,
+                home=price.home_delivery_price, office=price.office_delivery_price
+            )
+    price_matrix.advance(version)
+    
+    return jsonify({'success': True, 'updated': len(rows), 'version': version})
+
 @app.route('/add_price', methods=['POST'])
 @login_required
 def add_price():
@@ -483,14 +2059,18 @@ def add_price():
     if not all([price_type, wilaya, company_id]):
         return jsonify({'success': False, 'message': 'بيانات غير مكتملة'})
     
+    code = wilaya_code(wilaya)
+    if not code:
+        return jsonify({'success': False, 'message': 'الولاية غير معروفة'})
+    
     company = Company.query.get(company_id)
     if not company:
         return jsonify({'success': False, 'message': 'الشركة غير موجودة'})
     
     # البحث عن السعر الحالي أو إنشاء واحد جديد
-    price = DeliveryPrice.query.filter_by(company_id=company_id, wilaya=wilaya).first()
+    price = DeliveryPrice.query.filter_by(company_id=company_id, wilaya_code=code).first()
     if not price:
-        price = DeliveryPrice(company_id=company_id, wilaya=wilaya)
+        price = DeliveryPrice(company_id=company_id, wilaya_code=code, wilaya=ALGERIA_WILAYAS[code - 1])
         db.session.add(price)
     
     # تحديث السعر المناسب
@@ -500,11 +2080,18 @@ def add_price():
         price.office_delivery_price = value
     
     try:
+        version = bump_data_version(db.session.connection(), 'prices')
         db.session.commit()
+        price_matrix.set_price(
+            price.company_id, price.wilaya_code,
+            home=price.home_delivery_price, office=price.office_delivery_price
+        )
+        price_matrix.advance(version)
         return jsonify({
             'success': True,
             'message': 'تم إضافة/تحديث السعر بنجاح',
-            'price_id': price.id
+            'price_id': price.id,
+            'version': version
         })
     except Exception as e:
         db.session.rollback()
@@ -525,8 +2112,14 @@ def update_price(price_id):
         price.office_delivery_price = value
     
     try:
+        version = bump_data_version(db.session.connection(), 'prices')
         db.session.commit()
-        return jsonify({'success': True})
+        price_matrix.set_price(
+            price.company_id, price.wilaya_code,
+            home=price.home_delivery_price, office=price.office_delivery_price
+        )
+        price_matrix.advance(version)
+        return jsonify({'success': True, 'version': version})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
@@ -540,8 +2133,11 @@ def delete_price(price_id):
         # بدلاً من حذف السعر، نقوم بتصفير القيم
         price.home_delivery_price = 0
         price.office_delivery_price = 0
+        version = bump_data_version(db.session.connection(), 'prices')
         db.session.commit()
-        return jsonify({'success': True})
+        price_matrix.set_price(price.company_id, price.wilaya_code, home=0.0, office=0.0)
+        price_matrix.advance(version)
+        return jsonify({'success': True, 'version': version})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
@@ -580,17 +2176,64 @@ def settings():
                     flash('يرجى تحميل صورة بامتداد jpg أو jpeg أو png')
                     return redirect(url_for('settings'))
                 
-                # حفظ الصورة
-                filename = secure_filename(f'profile_{current_user.id}{file_ext}')
+                # حذف الصورة القديمة ثم حفظ الجديدة باسم جديد (النسخ المصغرة تنشأ في الخلفية)
+                old_image = current_user.profile_image
+                if old_image and old_image != 'default.png':
+                    old_image_path = os.path.join(app.config['UPLOAD_FOLDER'], old_image)
+                    if os.path.exists(old_image_path):
+                        os.remove(old_image_path)
+                filename = secure_filename(f'profile_{current_user.id}_{int(time.time())}{file_ext}')
                 profile_image.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
                 current_user.profile_image = filename
+                current_user.thumbnails = None
         
+        bump_data_version(db.session.connection(), user_scope(current_user.id))
         db.session.commit()
+        identity_cache.invalidate(current_user.id)
+        if profile_image and profile_image.filename:
+            queue_thumbnails('profile', current_user.id, current_user.profile_image)
         flash('تم تحديث البيانات بنجاح')
         return redirect(url_for('settings'))
     
     return render_template('settings.html')
 
+def _cache_stats():
+    return {
+        'identity': identity_cache.stats(),
+        'carrier_status': status_cache.stats(),
+        'autocomplete': autocomplete.stats()
+    }
+
+metrics.gauge('cache_hits_total', 'Cache hits', lambda: {
+    (('cache', name),): stats['hits'] for name, stats in _cache_stats().items()
+}, kind='counter')
+metrics.gauge('cache_misses_total', 'Cache misses', lambda: {
+    (('cache', name),): stats['misses'] for name, stats in _cache_stats().items()
+}, kind='counter')
+metrics.gauge('cache_entries', 'Entries held by each in-process cache', lambda: {
+    (('cache', name),): stats['entries'] for name, stats in _cache_stats().items()
+})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """المقاييس بصيغة Prometheus (لهذه العملية فقط)"""
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    token = app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+    elif request.remote_addr not in ('127.0.0.1', '::1') or 'X-Forwarded-For' in request.headers:
+        # وكيل عكسي على نفس الجهاز (nginx) يأتي من 127.0.0.1 لكنه ينقل طلبات من الخارج
+        abort(404)
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    """إحصائيات الذاكرات المؤقتة في هذه العملية (نسبة الإصابة والاستعلامات الموفرة)"""
+    return jsonify(dict(_cache_stats(), pid=os.getpid()))
+
 @app.route('/delete_order/<int:order_id>')
 @login_required
 def delete_order(order_id):
@@ -599,8 +2242,10 @@ def delete_order(order_id):
         flash('لا يمكنك حذف هذا الطلب')
         return redirect(url_for('track_orders'))
     
+    customer_id = order.customer_id
     db.session.delete(order)
     db.session.commit()
+    remember_customers(current_user.id, [customer_id])
     flash('تم حذف الطلب بنجاح')
     return redirect(url_for('track_orders'))
 
@@ -619,17 +2264,22 @@ def edit_order(order_id):
             flash('رقم الهاتف غير صحيح. يجب أن يبدأ بـ 05 أو 06 أو 07 ويتكون من 10 أرقام')
             return redirect(url_for('edit_order', order_id=order_id))
         
+        if request.form['delivery_type'] not in DELIVERY_TYPES or request.form['status'] not in STATUS_TEXT:
+            flash('نوع التوصيل أو الحالة غير صحيحة')
+            return redirect(url_for('edit_order', order_id=order_id))
+        
         order.customer_name = request.form['customer_name']
         order.customer_phone = phone
         order.customer_state = request.form['customer_state']
         order.customer_address = request.form['customer_address']
         order.product_type = request.form['product_type']
-        order.price = request.form['price']
+        order.price = float(request.form['price'])
         order.delivery_type = request.form['delivery_type']
         order.delivery_company = request.form.get('delivery_company')
         order.status = request.form['status']
         
         db.session.commit()
+        remember_customer(order)
         flash('تم تحديث الطلب بنجاح')
         return redirect(url_for('track_orders'))
     
@@ -643,99 +2293,328 @@ def update_status(order_id):
         return jsonify({'success': False, 'message': 'لا يمكنك تعديل هذا الطلب'})
     
     new_status = request.form.get('status')
-    if new_status not in ['pending', 'processing', 'delivered']:
+    if new_status not in STATUS_TEXT:
         return jsonify({'success': False, 'message': 'حالة غير صالحة'})
     
     order.status = new_status
     db.session.commit()
-    
-    status_text = {
-        'pending': 'قيد الانتظار',
-        'processing': 'قيد المعالجة',
-        'delivered': 'تم التوصيل'
-    }
+    remember_customer(order)
     
     return jsonify({
         'success': True,
         'message': 'تم تحديث الحالة بنجاح',
         'status': new_status,
-        'status_text': status_text[new_status]
+        'status_text': STATUS_TEXT[new_status]
     })
 
-@app.route('/check_delivery_status/<int:order_id>')
+@app.route('/update_status_bulk', methods=['POST'])
 @login_required
-def check_delivery_status(order_id):
-    order = Order.query.get_or_404(order_id)
-    if order.user_id != current_user.id:
-        return jsonify({'success': False, 'message': 'لا يمكنك التحقق من حالة هذا الطلب'})
+def update_status_bulk():
+    """تغيير حالة عدة طلبيات في طلب واحد
     
-    # التحقق من شركة التوصيل
-    if not order.delivery_company:
-        return jsonify({'success': False, 'message': 'لم يتم تحديد شركة التوصيل'})
-    
-    # الحصول على بيانات API لشركة التوصيل
-    delivery_company = Company.query.filter_by(name=order.delivery_company).first()
-    if not delivery_company:
-        return jsonify({'success': False, 'message': 'لم يتم العثور على بيانات شركة التوصيل'})
-    
-    # التحقق من الحالة حسب الشركة
-    status_result = None
-    if order.delivery_company == 'yalidin':
-        if not delivery_company.api_id or not delivery_company.api_token:
-            return jsonify({'success': False, 'message': 'بيانات API غير مكتملة'})
-        status_result = check_yalidin_status(
-            order.id,
-            delivery_company.api_id,
-            delivery_company.api_token
-        )
-    elif order.delivery_company == 'zr_express':
-        if not delivery_company.token or not delivery_company.cle:
-            return jsonify({'success': False, 'message': 'بيانات API غير مكتملة'})
-        status_result = check_zr_express_status(
-            order.id,
-            delivery_company.token,
-            delivery_company.cle
+    JSON: {"order_ids": [1, 2, 3], "status": "delivered"} أو {"statuses": {"1": "delivered", "2": "processing"}}
+    """
+    data = request.get_json(silent=True) or {}
+    if 'statuses' in data:
+        try:
+            new_statuses = {int(order_id): status for order_id, status in data['statuses'].items()}
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'بيانات غير صالحة'})
+    else:
+        try:
+            new_statuses = {int(order_id): data.get('status') for order_id in data.get('order_ids') or []}
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'بيانات غير صالحة'})
+    if not new_statuses:
+        return jsonify({'success': False, 'message': 'لم يتم تحديد أي طلب'})
+    if any(status not in STATUS_TEXT for status in new_statuses.values()):
+        return jsonify({'success': False, 'message': 'حالة غير صالحة'})
+    
+    # التحقق من الملكية وجلب القيم القديمة في استعلام IN واحد
+    connection = db.session.connection()
+    table = Order.__table__
+    owned = connection.execute(select(
+        table.c.id, table.c.user_id, table.c.created_at, table.c.status,
+        table.c.delivery_type, table.c.price, table.c.delivery_company, table.c.customer_id
+    ).where(table.c.id.in_(list(new_statuses)), table.c.user_id == current_user.id)).all()
+    
+    results = {order_id: {'success': False, 'message': 'لا يمكنك تعديل هذا الطلب'} for order_id in new_statuses}
+    changed = [row for row in owned if row.status != new_statuses[row.id]]
+    
+    if changed:
+        # تحديث واحد لكل الطلبيات
+        changed_ids = [row.id for row in changed]
+        targets = {new_statuses[order_id] for order_id in changed_ids}
+        new_value = targets.pop() if len(targets) == 1 else case(
+            {order_id: literal(new_statuses[order_id], table.c.status.type) for order_id in changed_ids},
+            value=table.c.id
         )
+        connection.execute(table.update().where(table.c.id.in_(changed_ids)).values(status=new_value))
+        
+        # التحديث الجماعي لا يمر بأحداث ORM: تحديث الملخص اليومي وقائمة التحقق هنا
+        deltas = {}
+        for row in changed:
+            old_values = dict(row._mapping)
+            add_revenue_delta(deltas, old_values, -1)
+            add_revenue_delta(deltas, dict(old_values, status=new_statuses[row.id]), 1)
+        apply_revenue_deltas(connection, deltas)
+        schedule_polls(connection, [
+            SimpleNamespace(id=row.id, delivery_company=row.delivery_company, status=new_statuses[row.id])
+            for row in changed
+        ])
+        refresh_customers(connection, {row.customer_id for row in changed if row.customer_id})
+        bump_data_version(connection, order_scope(current_user.id))
+    db.session.commit()
+    remember_customers(current_user.id, [row.customer_id for row in changed])
+    
+    for row in owned:
+        status = new_statuses[row.id]
+        results[row.id] = {'success': True, 'status': status, 'status_text': STATUS_TEXT[status]}
     
-    if status_result and status_result['status'] == 'success':
-        # تحديث حالة الطلب
-        new_status = status_result['delivery_status']
-        if new_status != order.status:
-            order.status = new_status
-            db.session.commit()
+    return jsonify({
+        'success': True,
+        'message': f'تم تحديث حالة {len(owned)} طلبات',
+        'results': results
+    })
+
+def carrier_lookups(carrier_names, rate_limiters=None):
+    """تحميل بيانات API مرة واحدة لكل شركة توصيل وإرجاع دالة الاستعلام الخاصة بها"""
+    rate_limiters = rate_limiters or {}
+    
+    def timed(name, lookup):
+        # المدة تقاس للاتصال بالشركة فقط (بدون انتظار حد الطلبات أو الذاكرة المؤقتة)
+        def timed_lookup(tracking_number):
+            with carrier_duration.time(carrier=name):
+                try:
+                    result = lookup(tracking_number)
+                except Exception:
+                    carrier_errors.inc(carrier=name)
+                    raise
+            if result.get('status') != 'success':
+                carrier_errors.inc(carrier=name)
+            return result
+        return timed_lookup
+    
+    def limited(name, lookup):
+        # الاستعلامات الموجودة في الذاكرة المؤقتة لا تستهلك من حد الشركة
+        limiter = rate_limiters.get(name)
+        lookup = timed(name, lookup)
+        return status_cache.wrap(name, limiter.wrap(lookup) if limiter else lookup)
+    
+    lookups = {name: 'لم يتم العثور على بيانات شركة التوصيل' for name in carrier_names}
+    for company in Company.query.filter(Company.name.in_(carrier_names)):
+        if company.name == 'yalidin':
+            if not company.api_id or not company.api_token:
+                lookups[company.name] = 'بيانات API غير مكتملة'
+            else:
+                lookups[company.name] = limited(
+                    company.name,
+                    partial(check_yalidin_status, api_id=company.api_id, api_token=company.api_token)
+                )
+        elif company.name == 'zr_express':
+            if not company.token or not company.cle:
+                lookups[company.name] = 'بيانات API غير مكتملة'
+            else:
+                lookups[company.name] = limited(
+                    company.name,
+                    partial(check_zr_express_status, token=company.token, cle=company.cle)
+                )
+    return lookups
+
+def refresh_orders_status(orders, rate_limiters=None):
+    """التحقق من حالة مجموعة طلبيات بالتوازي وحفظ كل التغييرات في commit واحد
+    
+    يعيد {order_id: نتيجة} بنفس صيغة check_delivery_status
+    """
+    jobs = [
+        StatusJob(order.id, order.delivery_company, order.id)
+        for order in orders
+        if order.delivery_company and order.status not in TERMINAL_STATUSES
+    ]
+    lookups = carrier_lookups({job.carrier for job in jobs}, rate_limiters)
+    carrier_results = refresh_statuses(
+        jobs, lookups,
+        max_workers=app.config['CARRIER_MAX_WORKERS'],
+        timeout=app.config['CARRIER_REFRESH_TIMEOUT']
+    )
+    
+    results = {}
+    changed = False
+    for order in orders:
+        if not order.delivery_company:
+            results[order.id] = {'success': False, 'message': 'لم يتم تحديد شركة التوصيل'}
+            continue
         
-        status_text = {
-            'pending': 'قيد الانتظار',
-            'processing': 'قيد المعالجة',
-            'delivered': 'تم التوصيل'
-        }
+        if order.status in TERMINAL_STATUSES:
+            # حالة نهائية: لا حاجة للاستعلام لدى الشركة
+            results[order.id] = {
+                'success': True,
+                'status': order.status,
+                'status_text': STATUS_TEXT[order.status],
+                'message': 'تم تحديث حالة الطلب'
+            }
+            continue
         
-        return jsonify({
-            'success': True,
-            'status': new_status,
-            'status_text': status_text[new_status],
-            'message': 'تم تحديث حالة الطلب'
+        status_result = carrier_results.get(order.id)
+        if status_result and status_result['status'] == 'success' and status_result['delivery_status'] in STATUS_TEXT:
+            new_status = status_result['delivery_status']
+            if new_status != order.status:
+                order.status = new_status
+                changed = True
+            results[order.id] = {
+                'success': True,
+                'status': new_status,
+                'status_text': STATUS_TEXT[new_status],
+                'message': 'تم تحديث حالة الطلب'
+            }
+        else:
+            message = status_result.get('message') if status_result else None
+            results[order.id] = {'success': False, 'message': message or 'فشل في التحقق من حالة الطلب'}
+    
+    if changed:
+        db.session.commit()
+    return results
+
+def poll_due_orders(batch_size=100, rate_limiters=None):
+    """دورة واحدة للمجدول: حجز الطلبيات المستحقة، تحديثها، ثم إعادة جدولتها"""
+    table = StatusPoll.__table__
+    now = datetime.utcnow()
+    owner = uuid.uuid4().hex
+    
+    # الحجز في UPDATE واحد حتى لا يأخذ عاملان نفس الطلبية
+    due = select(table.c.order_id).where(table.c.next_poll_at <= now).order_by(table.c.next_poll_at).limit(batch_size)
+    db.session.execute(table.update().where(table.c.order_id.in_(due)).values(
+        next_poll_at=now + timedelta(seconds=app.config['STATUS_POLL_LEASE']),
+        lease_owner=owner
+    ))
+    db.session.commit()
+    
+    polls = {poll.order_id: (poll.failures, poll.last_status_change_at)
+             for poll in StatusPoll.query.filter_by(lease_owner=owner)}
+    if not polls:
+        return 0
+    
+    orders = Order.query.filter(Order.id.in_(list(polls))).all()
+    old_status = {order.id: order.status for order in orders}
+    results = refresh_orders_status(orders, rate_limiters)
+    
+    # إعادة الجدولة: فاصل أقصر للطلبيات التي تغيرت حالتها مؤخراً، وتأخير متزايد عند الفشل
+    polled_at = datetime.utcnow()
+    updates = []
+    for order_id, (failures, changed_at) in polls.items():
+        result = results.get(order_id, {'success': False, 'message': 'الطلب غير موجود'})
+        if result['success']:
+            if result['status'] != old_status.get(order_id):
+                changed_at = polled_at
+            recent = changed_at and (polled_at - changed_at).total_seconds() < app.config['STATUS_POLL_INTERVAL']
+            interval = app.config['STATUS_POLL_HOT_INTERVAL'] if recent else app.config['STATUS_POLL_INTERVAL']
+            failures, error = 0, None
+        else:
+            failures += 1
+            interval = min(app.config['STATUS_POLL_INTERVAL'] * 2 ** (failures - 1), app.config['STATUS_POLL_MAX_BACKOFF'])
+            error = (result.get('message') or '')[:200]
+        updates.append({
+            'b_order_id': order_id,
+            'b_next_poll_at': polled_at + timedelta(seconds=jittered(interval, app.config['STATUS_POLL_JITTER'])),
+            'b_last_polled_at': polled_at,
+            'b_last_status_change_at': changed_at,
+            'b_failures': failures,
+            'b_last_error': error
         })
     
-    return jsonify({'success': False, 'message': 'فشل في التحقق من حالة الطلب'})
+    db.session.execute(table.update().where(table.c.order_id == bindparam('b_order_id')).values(
+        next_poll_at=bindparam('b_next_poll_at'),
+        last_polled_at=bindparam('b_last_polled_at'),
+        last_status_change_at=bindparam('b_last_status_change_at'),
+        failures=bindparam('b_failures'),
+        last_error=bindparam('b_last_error'),
+        lease_owner=None
+    ), updates)
+    db.session.commit()
+    return len(polls)
+
+def create_status_poller():
+    """إنشاء المجدول مع حدود الاستعلام لكل شركة"""
+    rate_limiters = {name: RateLimiter(rate) for name, rate in app.config['CARRIER_RATE_LIMITS'].items()}
+    
+    def poll_once(batch_size):
+        with app.app_context():
+            return poll_due_orders(batch_size, rate_limiters)
+    
+    return StatusPoller(
+        poll_once,
+        batch_size=app.config['STATUS_POLL_BATCH'],
+        idle_interval=app.config['STATUS_POLL_IDLE'],
+        jitter=app.config['STATUS_POLL_JITTER'],
+        logger=app.logger
+    )
+
+def start_status_poller():
+    """تشغيل المجدول داخل العملية (مع gunicorn: استدعاؤها من post_fork في عامل واحد فقط)"""
+    poller = create_status_poller()
+    poller.start()
+    atexit.register(poller.stop, 10)
+    return poller
+
+def background_polling():
+    return app.config['STATUS_POLLER'] in ('thread', 'worker')
+
+def expedite_polls(order_ids):
+    """جعل الطلبيات مستحقة الآن ليأخذها المجدول في دورته القادمة"""
+    table = StatusPoll.__table__
+    db.session.execute(table.update().where(table.c.order_id.in_(order_ids)).where(
+        table.c.lease_owner.is_(None)
+    ).values(next_poll_at=datetime.utcnow()))
+    db.session.commit()
+
+def stored_status(order):
+    """الحالة المحفوظة كما حدثها المجدول"""
+    return {
+        'success': True,
+        'status': order.status,
+        'status_text': STATUS_TEXT.get(order.status, order.status),
+        'message': 'تم تحديث حالة الطلب'
+    }
+
+@app.route('/check_delivery_status/<int:order_id>')
+@login_required
+def check_delivery_status(order_id):
+    order = Order.query.get_or_404(order_id)
+    if order.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'لا يمكنك التحقق من حالة هذا الطلب'})
+    
+    if background_polling():
+        if not order.delivery_company:
+            return jsonify({'success': False, 'message': 'لم يتم تحديد شركة التوصيل'})
+        expedite_polls([order.id])
+        return jsonify(stored_status(order))
+    
+    return jsonify(refresh_orders_status([order])[order.id])
 
 @app.route('/check_all_orders_status')
 @login_required
 def check_all_orders_status():
     """تحديث حالة جميع الطلبات"""
-    orders = Order.query.filter_by(user_id=current_user.id).all()
-    updated_orders = []
+    orders = Order.query.filter(
+        Order.user_id == current_user.id,
+        Order.delivery_company.isnot(None),
+        Order.delivery_company != '',
+        ACTIVE_ORDER
+    ).all()
     
-    for order in orders:
-        if order.delivery_company:
-            response = check_delivery_status(order.id)
-            if response.json['success']:
-                updated_orders.append(order.id)
+    if background_polling():
+        # المجدول يقوم بالعمل البطيء؛ هنا نقرأ الحالة المحفوظة فقط
+        expedite_polls([order.id for order in orders])
+        results = {order.id: stored_status(order) for order in orders}
+    else:
+        results = refresh_orders_status(orders)
+    updated_orders = [order_id for order_id, result in results.items() if result['success']]
     
     return jsonify({
         'success': True,
         'message': f'تم تحديث حالة {len(updated_orders)} طلبات',
-        'updated_orders': updated_orders
+        'updated_orders': updated_orders,
+        'results': results
     })
 
 @app.route('/upload_company_image/<int:company_id>', methods=['POST'])
@@ -763,9 +2642,14 @@ def upload_company_image(company_id):
         filename = secure_filename(f"company_{company_id}_{int(time.time())}{os.path.splitext(file.filename)[1]}")
         file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
         
-        # تحديث اسم الصورة في قاعدة البيانات
+        # تحديث اسم الصورة في قاعدة البيانات؛ النسخ المصغرة القديمة تحذف بعد تجهيز الجديدة
         company.image = filename
+        company.thumbnails = None
+        version = bump_data_version(db.session.connection(), 'prices')
         db.session.commit()
+        price_matrix.set_company(company.id, image=filename, thumbnails={})
+        price_matrix.advance(version)
+        queue_thumbnails('company', company.id, filename)
         
         flash('تم تحميل الصورة بنجاح', 'success')
     else:
@@ -777,9 +2661,84 @@ def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-if __name__ == '__main__':
-    app.app_context().push()  # Push an application context
+# أصحاب الصور: النوع -> (الجدول، عمود اسم الصورة الأصلية)؛ النوع هو أيضاً بداية أسماء النسخ
+THUMBNAIL_OWNERS = {'profile': (User, 'profile_image'), 'company': (Company, 'image')}
+
+def process_thumbnails(kind, owner_id, filename):
+    """مهمة الخلفية: إنشاء النسخ وحفظها إذا لم تتغير الصورة منذ الرفع، ثم حذف النسخ القديمة"""
+    model, image_column = THUMBNAIL_OWNERS[kind]
+    prefix = f'{kind}_{owner_id}'
+    manifest = thumbnails.make_thumbnails(
+        os.path.join(app.config['UPLOAD_FOLDER'], filename), app.config['THUMBNAIL_FOLDER'], prefix
+    )
+    with app.app_context():
+        table = model.__table__
+        updated = db.session.execute(table.update().where(
+            table.c.id == owner_id, table.c[image_column] == filename
+        ).values(thumbnails=manifest)).rowcount
+        if updated:
+            # الصفحات المحفوظة تشير إلى النسخ القديمة التي ستحذف في الأسفل
+            version = bump_data_version(db.session.connection(), 'prices' if kind == 'company' else user_scope(owner_id))
+        db.session.commit()
+    if not updated:
+        # رفعت صورة أحدث في الأثناء: مهمتها تحذف هذه النسخ
+        return
+    if kind == 'profile':
+        identity_cache.invalidate(owner_id)
+    else:
+        price_matrix.set_company(owner_id, thumbnails=manifest)
+        price_matrix.advance(version)
+    thumbnails.collect_garbage(app.config['THUMBNAIL_FOLDER'], prefix, thumbnails.variant_files(manifest))
+
+thumbnail_worker = thumbnails.ThumbnailWorker(process_thumbnails, logger=app.logger)
+metrics.gauge('thumbnail_jobs_pending', 'Image thumbnail jobs waiting in this process',
+              lambda: thumbnail_worker.stats()['pending'])
+metrics.gauge('thumbnail_failures_total', 'Failed image thumbnail jobs',
+              lambda: thumbnail_worker.stats()['failed'], kind='counter')
+
+def queue_thumbnails(kind, owner_id, filename):
+    """بعد حفظ صورة جديدة: إنشاء نسخها في الخلفية (بدون Pillow تعرض الصورة الأصلية وتحذف النسخ القديمة)"""
+    if thumbnails.pillow_available():
+        thumbnail_worker.submit(kind, owner_id, filename)
+    else:
+        thumbnails.collect_garbage(app.config['THUMBNAIL_FOLDER'], f'{kind}_{owner_id}', keep=())
+
+@app.route('/thumbs/<path:filename>')
+def thumbnail_file(filename):
+    """النسخ المصغرة: الاسم يتغير مع المحتوى، فيحفظها المتصفح دون إعادة التحقق"""
+    response = send_from_directory(app.config['THUMBNAIL_FOLDER'], filename, max_age=app.config['THUMBNAIL_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.template_global()
+def image_url(filename, manifest=None, size=128, extension='jpg'):
+    """رابط أصغر نسخة لا تقل عن size (webp أو jpg)، أو الصورة الأصلية إذا لم تجهز النسخ بعد"""
+    if manifest:
+        sizes = sorted(int(value) for value in manifest)
+        chosen = next((value for value in sizes if value >= size), sizes[-1])
+        return url_for('thumbnail_file', filename=manifest[str(chosen)][extension])
+    return url_for('static', filename=f'uploads/{filename}')
+
+@app.cli.command('rebuild-thumbnails')
+def rebuild_thumbnails_command():
+    """إنشاء النسخ المصغرة الناقصة (صور رفعت قبل هذه الميزة): flask --app app rebuild-thumbnails"""
+    if not thumbnails.pillow_available():
+        raise click.ClickException('مكتبة Pillow غير مثبتة')
+    jobs = []
+    for kind, (model, image_column) in THUMBNAIL_OWNERS.items():
+        image = getattr(model, image_column)
+        for owner_id, filename in db.session.query(model.id, image).filter(model.thumbnails.is_(None), image.isnot(None)):
+            if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+                jobs.append((kind, owner_id, filename))
+    for job in jobs:
+        process_thumbnails(*job)
+    print(f'تم إنشاء النسخ المصغرة لـ {len(jobs)} صورة')
+
+def init_db():
+    """إنشاء الجداول وترقيتها والبيانات الافتراضية"""
     db.create_all()
+    upgrade_schema()
     
     # إضافة شركات التوصيل الافتراضية إذا لم تكن موجودة
     if not Company.query.first():
@@ -799,5 +2758,31 @@ if __name__ == '__main__':
         # تهيئة أسعار التوصيل للولايات
         from wilayas import initialize_wilaya_prices
         initialize_wilaya_prices()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """تهيئة قاعدة البيانات مرة واحدة قبل تشغيل عدة عمال: flask --app app init-db
+    
+    ثم مثلاً: gunicorn -w 4 app:app (كل عامل يفتح اتصالاته الخاصة بإعدادات SQLITE_PROFILE)
+    """
+    init_db()
+    print('تمت تهيئة قاعدة البيانات')
+
+if __name__ == '__main__':
+    app.app_context().push()  # Push an application context
+    init_db()
+    
+    # تحميل أسعار التوصيل في الذاكرة
+    get_price_matrix()
+    
+    debug = os.environ.get('FLASK_DEBUG', '1') == '1'
+    # مع debug يعمل التطبيق في عملية فرعية للـ reloader؛ المجدول يبدأ فيها فقط
+    if app.config['STATUS_POLLER'] == 'thread' and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_status_poller()
     
-    app.run(debug=True)
+    app.run(
+        host=os.environ.get('FLASK_RUN_HOST', '127.0.0.1'),
+        port=int(os.environ.get('FLASK_RUN_PORT', 5000)),
+        debug=debug,
+        threaded=True
+    )
@@ -0,0 +1,163 @@
+"""اقتراح الزبائن أثناء الكتابة من فهرس بادئات في الذاكرة
+
+لكل تاجر قائمتان مرتبتان من (مفتاح، رقم الزبون): أرقام الهاتف وكلمات الاسم (مطبّعة كما في
+search_index). البحث bisect على البادئة ثم قراءة العناصر المتتالية، فلا يمر على SQLite.
+الفهرس يبنى عند أول طلب للتاجر بدالة loader ويحدث مباشرة عند حفظ طلب في نفس العملية؛
+العمليات الأخرى تعيد بناءه بعد انتهاء مدة الصلاحية (ttl).
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from search_index import normalize
+
+_TOKEN = re.compile(r'\w+')
+
+
+def phone_key(value):
+    """الأرقام فقط، مع الصفر الأول إذا كتب الرقم بدونه (555... -> 0555...)"""
+    digits = ''.join(ch for ch in str(value or '') if ch.isdigit())
+    if digits and digits[0] in '567':
+        digits = '0' + digits
+    return digits
+
+
+def name_keys(value):
+    return set(_TOKEN.findall(normalize(value)))
+
+
+class CustomerIndex:
+    """فهرس زبائن تاجر واحد؛ customer: dict فيه id وname وphone وorder_count على الأقل"""
+
+    def __init__(self, customers=()):
+        self.customers = {}
+        self._keys = {}  # id -> (مفتاح الهاتف، كلمات الاسم) لحذفها عند التحديث
+        self._phones = []
+        self._names = []
+        for customer in customers:
+            self.customers[customer['id']] = customer
+            keys = self._keys[customer['id']] = (phone_key(customer['phone']), name_keys(customer['name']))
+            self._phones.append((keys[0], customer['id']))
+            self._names.extend((word, customer['id']) for word in keys[1])
+        self._phones.sort()
+        self._names.sort()
+
+    def __len__(self):
+        return len(self.customers)
+
+    @staticmethod
+    def _remove(entries, entry):
+        index = bisect_left(entries, entry)
+        if index < len(entries) and entries[index] == entry:
+            del entries[index]
+
+    def put(self, customer):
+        customer_id = customer['id']
+        old_keys = self._keys.get(customer_id)
+        if old_keys:
+            self._remove(self._phones, (old_keys[0], customer_id))
+            for word in old_keys[1]:
+                self._remove(self._names, (word, customer_id))
+        keys = self._keys[customer_id] = (phone_key(customer['phone']), name_keys(customer['name']))
+        insort(self._phones, (keys[0], customer_id))
+        for word in keys[1]:
+            insort(self._names, (word, customer_id))
+        self.customers[customer_id] = customer
+
+    @staticmethod
+    def _prefix(entries, prefix):
+        """أرقام الزبائن الذين يبدأ مفتاحهم بـ prefix (بترتيب المفاتيح)"""
+        index = bisect_left(entries, (prefix,))
+        while index < len(entries):
+            key, customer_id = entries[index]
+            if not key.startswith(prefix):
+                break
+            yield customer_id
+            index += 1
+
+    def suggest(self, term, limit=10):
+        """أرقام: بادئة الهاتف؛ نص: كل كلمة بادئة لكلمة من الاسم. الأكثر طلبيات أولاً"""
+        term = str(term or '').strip()
+        if any(ch.isdigit() for ch in term) and not any(ch.isalpha() for ch in term):
+            prefix = phone_key(term)
+            ids = self._prefix(self._phones, prefix) if prefix else ()
+        else:
+            words = sorted(name_keys(term), key=len, reverse=True)
+            if not words:
+                return []
+            # المرشحون من أطول كلمة (أقل نتائج)، ثم التحقق من بقية الكلمات
+            ids = self._prefix(self._names, words[0])
+            if len(words) > 1:
+                ids = (
+                    customer_id for customer_id in ids
+                    if all(any(key.startswith(word) for key in self._keys[customer_id][1]) for word in words[1:])
+                )
+        # الترتيب على كل نطاق البادئة (كومة بحجم limit) وليس على أول المرشحين بترتيب المفاتيح
+        customers = (self.customers[customer_id] for customer_id in dict.fromkeys(ids))
+        return heapq.nlargest(limit, customers, key=lambda customer: customer.get('order_count') or 0)
+
+
+class Autocomplete:
+    """فهارس كل التجار في هذه العملية (الأقل استعمالاً يحذف أولاً بعد max_users)
+
+    loader(user_id) يعيد زبائن التاجر (قوائم dict) ويستدعى خارج القفل.
+    """
+
+    def __init__(self, loader, ttl=300, max_users=100, clock=time.monotonic):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_users = max_users
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._indexes = OrderedDict()  # user_id -> (CustomerIndex, وقت البناء)
+        self._lock = threading.Lock()
+
+    def _index(self, user_id):
+        now = self.clock()
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._indexes.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        index = CustomerIndex(self.loader(user_id))
+        with self._lock:
+            self._indexes[user_id] = (index, now)
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def suggest(self, user_id, term, limit=10):
+        index = self._index(user_id)
+        with self._lock:
+            return index.suggest(term, limit)
+
+    def put(self, user_id, customer):
+        """تحديث زبون بعد حفظ طلب (فقط إذا كان فهرس التاجر محملاً؛ وإلا يبنى لاحقاً من قاعدة البيانات)"""
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None:
+                entry[0].put(customer)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._indexes),
+                'entries': sum(len(index) for index, _ in self._indexes.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,188 @@
+"""النسخ الاحتياطي بصيغة JSON سطرية مضغوطة (NDJSON + gzip أو zstd)
+
+كل سطر في الملف سجل مستقل:
+    {"format": "tracker-backup", "version": 2, ...}   السطر الأول (الترويسة)
+    {"table": "order", "row": {...}}                   صف واحد من جدول
+
+تتم القراءة والكتابة صفاً بصف، فلا يتغير استهلاك الذاكرة مع حجم قاعدة البيانات.
+"""
+import gzip
+import io
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, select
+
+BACKUP_FORMAT = 'tracker-backup'
+BACKUP_VERSION = 2
+
+try:
+    import zstandard
+except ImportError:  # zstd اختياري
+    zstandard = None
+
+
+def backup_extension(compression='gzip'):
+    if compression == 'zstd' and zstandard is not None:
+        return '.jsonl.zst'
+    return '.jsonl.gz'
+
+
+def is_backup_file(filename):
+    return filename.endswith(('.json', '.jsonl.gz', '.jsonl.zst'))
+
+
+def open_backup(path, mode='r'):
+    """فتح ملف النسخة كنص حسب امتداده"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('مكتبة zstandard غير مثبتة')
+        if mode == 'w':
+            raw = zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+        else:
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(raw, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(path, mode, encoding='utf-8')
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def export_backup(connection, metadata, path, chunk_size=1000):
+    """كتابة كل جداول metadata في الملف مع قراءة الصفوف على دفعات
+
+    يعيد عدد الصفوف المكتوبة لكل جدول.
+    """
+    counts = {}
+    with open_backup(path, 'w') as f:
+        f.write(json.dumps({
+            'format': BACKUP_FORMAT,
+            'version': BACKUP_VERSION,
+            'created_at': datetime.now().isoformat(),
+            'tables': [table.name for table in metadata.sorted_tables]
+        }) + '\n')
+
+        for table in metadata.sorted_tables:
+            counts[table.name] = 0
+            result = connection.execution_options(stream_results=True).execute(
+                select(table).order_by(*table.primary_key.columns)
+            )
+            for rows in result.partitions(chunk_size):
+                for row in rows:
+                    f.write(json.dumps(
+                        {'table': table.name, 'row': dict(row._mapping)},
+                        ensure_ascii=False, default=_encode
+                    ) + '\n')
+                counts[table.name] += len(rows)
+    return counts
+
+
+def iter_backup_records(path):
+    """قراءة النسخة سجلاً بسجل: (اسم الجدول، الصف)
+
+    يدعم أيضاً ملفات JSON القديمة ({"users": [...], "orders": [...]}) والتي تقرأ كاملة.
+    """
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for row in data.get('users', []):
+            yield 'user', row
+        for row in data.get('orders', []):
+            yield 'order', row
+        return
+
+    with open_backup(path, 'r') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('format') != BACKUP_FORMAT:
+            raise ValueError('ملف النسخة الاحتياطية غير صالح')
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record['table'], record['row']
+
+
+def decode_row(table, row, complete=False):
+    """تحويل القيم النصية (التواريخ) إلى أنواع أعمدة الجدول وتجاهل الأعمدة غير الموجودة
+
+    مع complete=True تعطى الأعمدة الناقصة قيمتها الافتراضية حتى تتطابق مفاتيح كل صفوف
+    الدفعة الواحدة (شرط executemany).
+    """
+    values = {}
+    for column in table.columns:
+        if column.name not in row:
+            if complete:
+                default = column.default
+                values[column.name] = default.arg if default is not None and default.is_scalar else None
+            continue
+        value = row[column.name]
+        if isinstance(value, str):
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+
+class _SnapshotRestarted(Exception):
+    pass
+
+
+def snapshot_database(source_path, dest_path, pages=256, pause=0.005, busy_timeout=30, max_restarts=3):
+    """نسخة متسقة من قاعدة بيانات تعمل عبر واجهة SQLite للنسخ الاحتياطي (online backup)
+
+    يتم النسخ على خطوات من `pages` صفحة مع توقف قصير بين الخطوات حتى لا يُحجب الكتّاب طويلاً.
+    كل كتابة من اتصال آخر تعيد النسخ من البداية؛ بعد `max_restarts` إعادة ننسخ ما تبقى في
+    خطوة واحدة (قفل قراءة قصير) حتى لا يستمر النسخ بلا نهاية تحت ضغط الكتابة.
+    تُفحص النسخة بـ PRAGMA integrity_check قبل نقلها إلى مكانها النهائي.
+    يعيد {'size', 'duration', 'pages', 'steps', 'restarts'}.
+    """
+    started = time.perf_counter()
+    temp_path = dest_path + '.partial'
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0}
+    last_remaining = [None]
+
+    def on_progress(status, remaining, total):
+        stats['pages'] = total
+        stats['steps'] += 1
+        # لا تقدم بعد خطوة ناجحة = تمت إعادة النسخ من البداية بسبب كتابة جديدة
+        if status == sqlite3.SQLITE_OK and last_remaining[0] is not None and remaining >= last_remaining[0]:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise _SnapshotRestarted()
+        last_remaining[0] = remaining
+        if pause and remaining:
+            time.sleep(pause)
+
+    source = sqlite3.connect(source_path, timeout=busy_timeout)
+    target = sqlite3.connect(temp_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=on_progress)
+        except _SnapshotRestarted:
+            source.backup(target, pages=-1)
+            stats['steps'] += 1
+        result = target.execute('PRAGMA integrity_check').fetchone()[0]
+        if result != 'ok':
+            raise RuntimeError(f'فشل فحص سلامة النسخة: {result}')
+    except Exception:
+        target.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    os.replace(temp_path, dest_path)
+    stats['size'] = os.path.getsize(dest_path)
+    stats['duration'] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,154 @@
+"""قياس أداء SQLite مع عدة عمليات متزامنة (قبل/بعد إعدادات sqlite_profile.py)
+
+    python bench_sqlite.py --workers 4 --seconds 10 --write-ratio 0.2
+
+لكل ملف إعدادات: قاعدة بيانات مؤقتة بنفس جداول التطبيق وعدد من الطلبيات، ثم N عملية
+تنفذ قراءات (صفحة طلبيات بالمؤشر) وكتابات (طلبية جديدة + تغيير حالة) لمدة محددة.
+'default' هو الإعداد السابق للتطبيق: إعدادات SQLite الافتراضية ومجمع اتصالات SQLAlchemy الافتراضي.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from sqlite_profile import PROFILES, apply_pragmas, engine_options, sqlite_pragmas
+
+USERS = 10
+STATUSES = ('pending', 'processing', 'delivered')
+
+
+def make_engine(path, profile):
+    pragmas = sqlite_pragmas(profile)
+    options = engine_options(pragmas) if profile != 'default' else {}
+    engine = create_engine(f'sqlite:///{path}', **options)
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+    return engine
+
+
+def order_row(user_id, created_at):
+    return {
+        'user_id': user_id,
+        'customer_name': 'زبون تجريبي',
+        'customer_phone': '0550000000',
+        'customer_state': '16 - الجزائر',
+        'customer_address': 'العنوان',
+        'product_type': 'منتج',
+        'price': 2500.0,
+        'delivery_type': 'home',
+        'delivery_company': 'yalidin',
+        'status': 'pending',
+        'created_at': created_at,
+    }
+
+
+def prepare(path, profile, rows):
+    from app import db
+
+    engine = make_engine(path, profile)
+    db.metadata.create_all(engine)
+    users = db.metadata.tables['user']
+    orders = db.metadata.tables['order']
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(users), [
+            {'id': user_id, 'username': f'user{user_id}', 'password': '-'} for user_id in range(1, USERS + 1)
+        ])
+        connection.execute(insert(orders), [
+            order_row(i % USERS + 1, start + timedelta(minutes=i)) for i in range(rows)
+        ])
+    engine.dispose()
+
+
+def worker(path, profile, seconds, write_ratio, results):
+    from app import db
+
+    orders = db.metadata.tables['order']
+    engine = make_engine(path, profile)
+    rng = random.Random(os.getpid())
+    stats = {'reads': 0, 'writes': 0, 'locked': 0, 'latencies': []}
+    page = (
+        select(orders.c.id, orders.c.customer_name, orders.c.price, orders.c.status, orders.c.created_at)
+        .order_by(orders.c.created_at.desc(), orders.c.id.desc())
+        .limit(50)
+    )
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, USERS)
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                with engine.begin() as connection:
+                    connection.execute(insert(orders), order_row(user_id, datetime.utcnow()))
+                    connection.execute(
+                        update(orders)
+                        .where(orders.c.id == rng.randint(1, 1000))
+                        .values(status=rng.choice(STATUSES))
+                    )
+                stats['writes'] += 1
+            else:
+                with engine.connect() as connection:
+                    connection.execute(page.where(orders.c.user_id == user_id)).fetchall()
+                stats['reads'] += 1
+        except OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            stats['locked'] += 1
+        stats['latencies'].append(time.perf_counter() - started)
+    engine.dispose()
+    results.put(stats)
+
+
+def run(profile, workers, seconds, write_ratio, rows):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        prepare(path, profile, rows)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(path, profile, seconds, write_ratio, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    latencies = sorted(latency for stats in collected for latency in stats['latencies'])
+    return {
+        'reads': sum(stats['reads'] for stats in collected) / seconds,
+        'writes': sum(stats['writes'] for stats in collected) / seconds,
+        'locked': sum(stats['locked'] for stats in collected),
+        'p50': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--rows', type=int, default=20000, help='عدد الطلبيات الأولية')
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES), help='الافتراضي: default ثم production')
+    args = parser.parse_args()
+
+    print(f'{"profile":<12}{"workers":>8}{"reads/s":>10}{"writes/s":>10}{"locked":>8}{"p50 ms":>9}{"p99 ms":>9}')
+    for workers in args.workers:
+        for profile in args.profile or ['default', 'production']:
+            result = run(profile, workers, args.seconds, args.write_ratio, args.rows)
+            print(
+                f'{profile:<12}{workers:>8}{result["reads"]:>10.0f}{result["writes"]:>10.0f}'
+                f'{result["locked"]:>8}{result["p50"]:>9.2f}{result["p99"]:>9.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
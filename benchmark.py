@@ -0,0 +1,191 @@
+"""قياس أداء المسارات الرئيسية والنسخ الاحتياطي بأحجام مختلفة ومقارنتها بخط أساس محفوظ
+
+    python benchmark.py                              # 1k و100k و1M طلبية
+    python benchmark.py --orders 1000 100000 --repeat 50
+    python benchmark.py --orders 1000 --save-baseline
+    python benchmark.py --fail-on-regression         # رمز خروج 1 إذا كان هناك تراجع
+
+لكل حجم: قاعدة بيانات مؤقتة تملأ بـ generate_data.py (نفس البذرة دائماً)، ثم يقاس كل
+مسار عبر Flask test client وكل دالة مباشرة. يعرض p50/p95/p99 بالميلي ثانية وذروة
+الذاكرة (tracemalloc: ذاكرة Python فقط، في تشغيل إضافي حتى لا يؤثر على التوقيت).
+التراجع: p50 أو ذروة الذاكرة أكبر من خط الأساس بأكثر من --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+METRICS = ('p50_ms', 'peak_kb')
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, repeat, warmup=True):
+    if warmup:
+        func()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def build_cases(app, client, workdir, repeat, io_repeat):
+    from app import serialize_data, deserialize_data
+    from wilayas import initialize_wilaya_prices
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+            return response
+        return request
+
+    def in_context(func):
+        def call():
+            with app.app_context():
+                func()
+        return call
+
+    # مؤشر الصفحة العاشرة (ترقيم بالمؤشر)
+    cursor = None
+    for _ in range(9):
+        cursor = get(f'/track_orders?format=json&cursor={cursor or ""}')().get_json()['next_cursor']
+        if not cursor:
+            break
+
+    phone = get('/track_orders?format=json&per_page=1')().get_json()['orders'][0]['customer_phone']
+    today = datetime.utcnow().date()
+    month = f'start_date={today - timedelta(days=30)}&end_date={today}'
+    backup_path = os.path.join(workdir, 'benchmark.jsonl.gz')
+    return [
+        ('track_orders', get('/track_orders?format=json'), repeat, True),
+        ('track_orders_page10', get(f'/track_orders?format=json&cursor={cursor or ""}'), repeat, True),
+        ('track_orders_search', get('/track_orders?format=json&search_name=محمد'), repeat, True),
+        ('revenue', get('/revenue?format=json'), repeat, True),
+        ('revenue_30d', get(f'/revenue?format=json&{month}'), repeat, True),
+        ('revenue_daily', get('/revenue/daily'), repeat, True),
+        ('customer_history', get(f'/customers/{phone}'), repeat, True),
+        ('customer_suggest', get(f'/customers/suggest?q={phone[:5]}'), repeat, True),
+        ('quote', get('/quote?wilaya=16'), repeat, True),
+        ('initialize_wilaya_prices', in_context(initialize_wilaya_prices), repeat, True),
+        ('serialize_data', in_context(lambda: serialize_data(backup_path)), io_repeat, False),
+        ('deserialize_data', in_context(lambda: deserialize_data(backup_path)), io_repeat, False),
+    ]
+
+
+def run_scale(orders, users, repeat, io_repeat, workdir):
+    from app import app
+    from generate_data import generate, PASSWORD
+
+    with app.app_context():
+        generated = generate(orders, users, reset=True)
+    print(f'# {orders} طلبية ({generated["duration"]:.1f} ثانية للإنشاء)', file=sys.stderr)
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'user1', 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError('فشل تسجيل الدخول')
+
+    results = {}
+    for name, func, case_repeat, warmup in build_cases(app, client, workdir, repeat, io_repeat):
+        results[name] = measure(func, case_repeat, warmup)
+    return results
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results):
+    merged = load_baseline(path)
+    merged.update(results)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': f'{platform.system()} {platform.machine()} Python {platform.python_version()}',
+            'results': merged,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def report(results, baseline, tolerance):
+    """طباعة النتائج مع الفرق عن خط الأساس؛ يعيد قائمة التراجعات"""
+    regressions = []
+    print(f'{"orders":>8}  {"case":<26}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"peak KB":>11}{"Δp50":>8}')
+    for scale, cases in results.items():
+        for name, metrics in cases.items():
+            base = baseline.get(scale, {}).get(name)
+            change = ''
+            if base:
+                if base['p50_ms']:
+                    change = f'{(metrics["p50_ms"] / base["p50_ms"] - 1) * 100:+.0f}%'
+                for metric in METRICS:
+                    if base.get(metric) and metrics[metric] > base[metric] * (1 + tolerance):
+                        regressions.append(f'{scale} {name} {metric}: {base[metric]} -> {metrics[metric]}')
+            print(f'{scale:>8}  {name:<26}{metrics["p50_ms"]:>10.2f}{metrics["p95_ms"]:>10.2f}'
+                  f'{metrics["p99_ms"]:>10.2f}{metrics["peak_kb"]:>11.1f}{change:>8}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=30, help='عدد التكرارات لكل مسار')
+    parser.add_argument('--io-repeat', type=int, default=3, help='عدد التكرارات للنسخ والاستعادة')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='نسبة التراجع المقبولة (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='حفظ النتائج كخط أساس جديد')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # يجب تحديد قاعدة البيانات قبل استيراد التطبيق
+        os.environ['ORDERS_DB'] = os.path.join(workdir, 'benchmark.db')
+        results = {
+            str(orders): run_scale(orders, args.users, args.repeat, args.io_repeat, workdir)
+            for orders in args.orders
+        }
+
+    regressions = report(results, load_baseline(args.baseline), args.tolerance)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f'تم حفظ خط الأساس في {args.baseline}')
+    if regressions:
+        print('\nتراجع في الأداء:')
+        for regression in regressions:
+            print(f'  {regression}')
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""تحديث حالات الطلبيات من شركات التوصيل بالتوازي
+
+لا يلمس هذا الملف قاعدة البيانات: يستقبل قائمة الطلبيات المطلوب التحقق منها ودالة
+استعلام لكل شركة (بعد تحميل بيانات API مرة واحدة)، ويعيد نتيجة لكل طلب.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class StatusJob:
+    """طلب واحد للتحقق من حالته لدى شركة التوصيل"""
+    __slots__ = ('order_id', 'carrier', 'tracking_number')
+
+    def __init__(self, order_id, carrier, tracking_number):
+        self.order_id = order_id
+        self.carrier = carrier
+        self.tracking_number = tracking_number
+
+
+class StatusCache:
+    """ذاكرة مؤقتة لنتائج شركات التوصيل بمفتاح (الشركة، رقم التتبع) مع مدة صلاحية وإخراج LRU
+
+    الطلبيات التي تغيرت حالتها مؤخراً تنتهي صلاحيتها أسرع (hot_ttl) حتى يتم التحقق منها أكثر.
+    """
+
+    def __init__(self, ttl=300, hot_ttl=60, hot_window=3600, max_entries=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.hot_ttl = hot_ttl
+        self.hot_window = hot_window
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (result, stored_at, changed_at)
+        self._lock = threading.Lock()
+
+    def _expires_after(self, stored_at, changed_at):
+        recently_changed = changed_at is not None and stored_at - changed_at < self.hot_window
+        return self.hot_ttl if recently_changed else self.ttl
+
+    def get(self, carrier, tracking_number):
+        key = (carrier, tracking_number)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, stored_at, changed_at = entry
+                if now - stored_at < self._expires_after(stored_at, changed_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, carrier, tracking_number, result):
+        key = (carrier, tracking_number)
+        now = self.clock()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            changed_at = None
+            if previous is not None:
+                changed_at = previous[2]
+                if previous[0].get('delivery_status') != result.get('delivery_status'):
+                    changed_at = now
+            self._entries[key] = (result, now, changed_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, carrier, tracking_number):
+        with self._lock:
+            self._entries.pop((carrier, tracking_number), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def wrap(self, carrier, lookup):
+        """دالة استعلام تمر أولاً على الذاكرة المؤقتة؛ النتائج الناجحة فقط يتم حفظها"""
+        def cached_lookup(tracking_number):
+            result = self.get(carrier, tracking_number)
+            if result is None:
+                result = lookup(tracking_number)
+                if result.get('status') == 'success':
+                    self.put(carrier, tracking_number, result)
+            return result
+        return cached_lookup
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+
+def _lookup(lookup, job):
+    try:
+        return lookup(job.tracking_number)
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}
+
+
+def refresh_statuses(jobs, lookups, max_workers=8, timeout=None):
+    """تنفيذ الاستعلامات بتوازٍ محدود
+
+    jobs: قائمة StatusJob
+    lookups: {اسم الشركة: دالة(tracking_number) -> {'status': 'success', 'delivery_status': ...}}
+             أو {اسم الشركة: رسالة خطأ} إذا كانت بيانات الشركة غير صالحة
+    يعيد {order_id: نتيجة الشركة}
+    """
+    results = {}
+    pending = []
+    for job in jobs:
+        lookup = lookups.get(job.carrier)
+        if not callable(lookup):
+            results[job.order_id] = {'status': 'error', 'message': lookup or 'شركة توصيل غير معروفة'}
+        else:
+            pending.append((job, lookup))
+
+    if not pending:
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending))))
+    try:
+        futures = {executor.submit(_lookup, lookup, job): job for job, lookup in pending}
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            results[futures[future].order_id] = future.result()
+        for future in not_done:
+            future.cancel()
+            results[futures[future].order_id] = {'status': 'error', 'message': 'انتهت مهلة الاتصال بشركة التوصيل'}
+    finally:
+        # عدم انتظار الطلبات العالقة بعد انتهاء المهلة
+        executor.shutdown(wait=False)
+    return results
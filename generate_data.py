@@ -0,0 +1,156 @@
+"""ملء قاعدة البيانات بطلبيات تجريبية بأحجام واقعية
+
+    python generate_data.py --orders 100000 --users 10
+    python generate_data.py --orders 1000000 --db /tmp/bench.db --reset
+
+الطلبيات موزعة على الولايات الـ 58 (الولايات الكبيرة أكثر)، شركات التوصيل، أنواع التوصيل
+والتواريخ، وأغلبها من زبائن سابقين؛ الطلبيات القديمة غالباً مسلمة (وبعضها مرتجع) والحديثة
+قيد الانتظار أو المعالجة. نفس البذرة
+(--seed) تعطي نفس البيانات. كلمة مرور كل المستخدمين: password
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from wilayas import ALGERIA_WILAYAS
+
+PASSWORD = 'password'
+
+# وزن كل ولاية حسب رقمها (تقريب لعدد السكان)؛ الباقي وزنه 1، والولايات الجديدة (49-58) أقل
+WILAYA_WEIGHTS = {16: 10, 31: 6, 19: 5, 25: 4, 9: 4, 5: 3, 15: 3, 6: 3, 17: 3, 2: 3, 35: 3, 13: 2, 23: 2, 7: 2, 39: 2}
+FIRST_NAMES = ('محمد', 'أحمد', 'يوسف', 'عبد القادر', 'إبراهيم', 'سمير', 'كريم', 'رياض', 'أمين', 'بلال',
+               'فاطمة', 'خديجة', 'أمينة', 'سارة', 'مريم', 'نسرين', 'ياسمين', 'إيمان', 'حنان', 'ليلى')
+LAST_NAMES = ('بن علي', 'بوزيد', 'حمدي', 'سعدي', 'بلقاسم', 'مرابط', 'زروقي', 'عمراني', 'بوعلام', 'شريف',
+              'قاسمي', 'بن يوسف', 'رحماني', 'حداد', 'مسعودي')
+PRODUCTS = (('ساعة يد', 3500), ('حذاء رياضي', 5200), ('حقيبة يد', 4300), ('عطر', 2900), ('سماعات', 2400),
+            ('قميص', 1800), ('فستان', 4800), ('خلاط كهربائي', 6900), ('هاتف', 28000), ('شاحن', 1200))
+DELIVERY_TYPES = (('home', 60), ('office', 35), ('free', 5))
+CARRIERS = (('yalidin', 55), ('zr_express', 40), (None, 5))
+# نسبة الطلبيات من زبائن سابقين (نفس الهاتف والاسم والولاية)
+REPEAT_RATE = 0.6
+
+
+def _choices(pairs):
+    values, weights = zip(*pairs)
+    return values, weights
+
+
+def _status(rng, age_days):
+    if age_days > 10:
+        return rng.choices(('delivered', 'returned', 'processing', 'pending'), (78, 7, 5, 10))[0]
+    if age_days > 3:
+        return rng.choices(('delivered', 'processing', 'pending'), (40, 45, 15))[0]
+    return rng.choices(('delivered', 'processing', 'pending'), (5, 35, 60))[0]
+
+
+def iter_orders(count, user_ids, rng, days=365, now=None):
+    """صفوف الطلبيات مرتبة حسب التاريخ (كما تدخل في الواقع)"""
+    now = now or datetime.utcnow()
+    codes = range(1, len(ALGERIA_WILAYAS) + 1)
+    wilaya_weights = [WILAYA_WEIGHTS.get(code, 1 if code <= 48 else 0.3) for code in codes]
+    delivery_types, delivery_weights = _choices(DELIVERY_TYPES)
+    carriers, carrier_weights = _choices(CARRIERS)
+    offsets = sorted((rng.random() * days for _ in range(count)), reverse=True)
+
+    customers = []
+    for offset in offsets:
+        product, base_price = rng.choice(PRODUCTS)
+        if customers and rng.random() < REPEAT_RATE:
+            user_id, name, phone, code = rng.choice(customers)
+        else:
+            user_id, name, phone, code = (
+                rng.choice(user_ids),
+                f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                f'0{rng.choice("567")}{rng.randrange(10 ** 8):08d}',
+                rng.choices(codes, wilaya_weights)[0]
+            )
+            customers.append((user_id, name, phone, code))
+        yield {
+            'user_id': user_id,
+            'customer_name': name,
+            'customer_phone': phone,
+            'customer_state': ALGERIA_WILAYAS[code - 1],
+            'wilaya_code': code,
+            'customer_address': f'حي {rng.randint(1, 500)} مسكن، عمارة {rng.randint(1, 40)}',
+            'product_type': product,
+            'price': float(round(base_price * rng.uniform(0.8, 1.3), -1)),
+            'delivery_type': rng.choices(delivery_types, delivery_weights)[0],
+            'delivery_company': rng.choices(carriers, carrier_weights)[0],
+            'status': _status(rng, offset),
+            'created_at': now - timedelta(days=offset),
+        }
+
+
+def generate(orders=100000, users=10, seed=42, days=365, batch_size=10000, reset=False):
+    """إنشاء المستخدمين والشركات والأسعار والطلبيات ثم إعادة بناء البيانات المشتقة
+
+    يجب استدعاؤها داخل app.app_context(). يعيد {'orders', 'users', 'duration'}.
+    """
+    from werkzeug.security import generate_password_hash
+    from app import db, User, Company, init_db, rebuild_derived_data, price_matrix, identity_cache, \
+        autocomplete, bump_data_version, order_scope
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    if reset:
+        db.session.remove()
+        db.drop_all()
+    init_db()
+
+    password = generate_password_hash(PASSWORD)
+    user_ids = []
+    for number in range(1, users + 1):
+        user = User.query.filter_by(username=f'user{number}').first()
+        if not user:
+            user = User(username=f'user{number}', password=password)
+            db.session.add(user)
+            db.session.flush()
+        user_ids.append(user.id)
+    db.session.commit()
+
+    table = db.metadata.tables['order']
+    connection = db.session.connection()
+    batch = []
+    for row in iter_orders(orders, user_ids, rng, days):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+
+    # الإدخال الجماعي لا يمر على أحداث ORM: الملخص اليومي وفهرس البحث وقائمة التحقق تبنى مرة واحدة
+    rebuild_derived_data(connection)
+    for user_id in user_ids:
+        bump_data_version(connection, order_scope(user_id))
+    db.session.commit()
+    price_matrix.invalidate()
+    identity_cache.invalidate()
+    autocomplete.invalidate()
+    return {'orders': orders, 'users': len(user_ids), 'companies': Company.query.count(),
+            'duration': time.perf_counter() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365, help='الفترة التي تتوزع عليها الطلبيات')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='مسار قاعدة البيانات (الافتراضي orders.db أو ORDERS_DB)')
+    parser.add_argument('--reset', action='store_true', help='حذف كل البيانات الموجودة أولاً')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['ORDERS_DB'] = os.path.abspath(args.db)
+    from app import app
+
+    with app.app_context():
+        result = generate(args.orders, args.users, args.seed, args.days, reset=args.reset)
+    print(f'تم إنشاء {result["orders"]} طلبية لـ {result["users"]} مستخدم في {result["duration"]:.1f} ثانية')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""ذاكرة مؤقتة لبيانات المستخدمين أمام load_user
+
+كل عملية تحتفظ بنسختها (قيم أعمدة المستخدم) مع مدة صلاحية. عند تعديل مستخدم يتم
+استبدال ملف صغير مشترك (stamp_path)؛ كل عملية تقارن هوية الملف (inode + وقت التعديل)
+مرة في كل طلب وتفرغ ذاكرتها إذا تغير، فلا تبقى بيانات قديمة في العمال الآخرين.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class IdentityCache:
+    def __init__(self, ttl=300, max_entries=10000, stamp_path=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stamp_path = stamp_path
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.started_at = clock()
+        self._entries = OrderedDict()  # user_id -> (values, stored_at)
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _check_stamp(self):
+        """تفريغ الذاكرة إذا قامت عملية أخرى بإلغاء صلاحيتها"""
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._entries.clear()
+            self._stamp = stamp
+
+    def get(self, user_id):
+        now = self.clock()
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (values, self.clock())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """حذف مستخدم (أو الكل) من هذه العملية وإبلاغ العمليات الأخرى"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+            if self.stamp_path:
+                # ملف جديد في كل مرة (os.replace) حتى يتغير الـ inode حتى لو لم تتغير دقة الوقت
+                temp_path = f'{self.stamp_path}.{uuid.uuid4().hex}'
+                with open(temp_path, 'w') as f:
+                    f.write(str(user_id or ''))
+                os.replace(temp_path, self.stamp_path)
+                self._stamp = self._read_stamp()
+
+    def stats(self):
+        total = self.hits + self.misses
+        uptime = self.clock() - self.started_at
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'saved_queries_per_second': self.hits / uptime if uptime > 0 else 0.0
+        }
@@ -0,0 +1,197 @@
+"""مقاييس التطبيق بصيغة Prometheus النصية
+
+عدادات ومدرجات تكرارية (histograms) بسيطة في ذاكرة العملية، مع تتبع استعلامات SQL
+لكل طلب (عددها ومدتها وأبطؤها). مع enabled=False لا يسجل شيء وكلفة الاستدعاء مجرد شرط.
+كل عملية (عامل gunicorn) لها أرقامها الخاصة.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, help):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = _key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, buckets=DURATION_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._values = {}  # key -> [عدد كل فئة..., المجموع، العدد]
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = _key(labels)
+        with self.registry.lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """قياس مدة كتلة with بالثواني"""
+        if not self.registry.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """نفس time() كـ decorator"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        samples = []
+        for key, counts in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f'{self.name}_bucket', key, count, (('le', _format_value(float(bound))),)))
+            samples.append((f'{self.name}_bucket', key, counts[-1], (('le', '+Inf'),)))
+            samples.append((f'{self.name}_sum', key, counts[-2]))
+            samples.append((f'{self.name}_count', key, counts[-1]))
+        return samples
+
+
+class Gauge:
+    """قيمة تحسب عند القراءة: callback يعيد رقماً أو {((اسم، قيمة), ...): رقم}
+
+    kind='counter' لقيم تزداد فقط وتحسب في مكان آخر (مثل إصابات ذاكرة مؤقتة).
+    """
+
+    def __init__(self, registry, name, help, callback, kind='gauge'):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            return [(self.name, _key(dict(labels)), item) for labels, item in value.items()]
+        return [(self.name, (), value)]
+
+
+class Registry:
+    def __init__(self, prefix='tracker', enabled=True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self._metrics = []
+
+    def _add(self, metric):
+        metric.name = f'{self.prefix}_{metric.name}'
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help):
+        return self._add(Counter(self, name, help))
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS):
+        return self._add(Histogram(self, name, help, buckets))
+
+    def gauge(self, name, help, callback, kind='gauge'):
+        return self._add(Gauge(self, name, help, callback, kind))
+
+    def render(self):
+        """النص الذي يقرأه Prometheus (text format 0.0.4)"""
+        lines = []
+        with self.lock:
+            for metric in self._metrics:
+                samples = metric.samples()
+                if not samples:
+                    continue
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for sample in samples:
+                    name, key, value = sample[:3]
+                    extra = sample[3] if len(sample) > 3 else ()
+                    lines.append(f'{name}{_format_labels(key, extra)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class QueryTracker:
+    """عدد ومدة استعلامات SQL للطلب الجاري في الخيط الحالي"""
+
+    def __init__(self, keep_statements=False):
+        self.keep_statements = keep_statements
+        self._local = threading.local()
+
+    def start(self):
+        self._local.stats = {'count': 0, 'duration': 0.0, 'statements': {}}
+
+    def stop(self):
+        stats = getattr(self._local, 'stats', None)
+        self._local.stats = None
+        return stats
+
+    def record(self, statement, duration):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            return
+        stats['count'] += 1
+        stats['duration'] += duration
+        if self.keep_statements:
+            # نفس الاستعلام المتكرر (N+1) يجمع في سطر واحد
+            total, count = stats['statements'].get(statement, (0.0, 0))
+            stats['statements'][statement] = (total + duration, count + 1)
+
+
+def top_statements(stats, limit=5):
+    """أبطأ الاستعلامات (بالمدة الإجمالية): [(المدة، العدد، النص)]"""
+    ranked = sorted(stats['statements'].items(), key=lambda item: item[1][0], reverse=True)
+    return [(total, count, statement) for statement, (total, count) in ranked[:limit]]
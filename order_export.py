@@ -0,0 +1,76 @@
+"""تصدير الطلبيات إلى CSV أو XLSX بشكل متدفق
+
+الدوال هنا تستقبل مولّداً للصفوف (يقرأ من قاعدة البيانات على دفعات) وتعيد مولّداً
+لأجزاء الملف، فيبدأ التحميل مباشرة ويبقى استهلاك الذاكرة ثابتاً مهما كان عدد الطلبيات.
+أسماء الأعمدة من COLUMN_ALIASES في order_import حتى يمكن إعادة استيراد الملف.
+"""
+import csv
+import io
+import tempfile
+
+# (الحقل، العنوان في الملف)
+EXPORT_COLUMNS = (
+    ('id', 'رقم الطلب'),
+    ('created_at', 'التاريخ'),
+    ('customer_name', 'الاسم'),
+    ('customer_phone', 'الهاتف'),
+    ('customer_state', 'الولاية'),
+    ('customer_address', 'العنوان'),
+    ('product_type', 'المنتج'),
+    ('price', 'السعر'),
+    ('delivery_type', 'نوع التوصيل'),
+    ('delivery_company', 'شركة التوصيل'),
+    ('status', 'الحالة'),
+)
+EXPORT_FIELDS = tuple(field for field, _ in EXPORT_COLUMNS)
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def iter_csv(chunks):
+    """chunks: مولّد قوائم صفوف (tuple بترتيب EXPORT_FIELDS)؛ يعيد نصاً لكل دفعة"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM حتى يعرض Excel الحروف العربية بشكل صحيح
+    buffer.write('\ufeff')
+    writer.writerow([title for _, title in EXPORT_COLUMNS])
+    yield buffer.getvalue()
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def xlsx_available():
+    try:
+        import openpyxl
+    except ImportError:
+        return False
+    return True
+
+
+def iter_xlsx(chunks, read_size=64 * 1024):
+    """ملف XLSX لا يكتمل إلا في النهاية (ملف zip)؛ openpyxl في وضع write_only يكتب الصفوف
+    إلى ملف مؤقت بدلاً من الذاكرة ثم يرسل الملف على أجزاء"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('الطلبيات')
+    sheet.append([title for _, title in EXPORT_COLUMNS])
+    for rows in chunks:
+        for row in rows:
+            sheet.append(row)
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            data = f.read(read_size)
+            if not data:
+                break
+            yield data
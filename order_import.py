@@ -0,0 +1,140 @@
+"""استيراد الطلبيات من ملفات CSV أو XLSX
+
+الملف يقرأ صفاً بصف، والتحقق يتم على دفعات؛ الصفوف الصالحة من كل دفعة تمرر إلى
+insert_batch (معاملة واحدة لكل دفعة) والصفوف الخاطئة تجمع في تقرير برقم السطر.
+"""
+import codecs
+import csv
+
+# أسماء الأعمدة المقبولة في الملف لكل حقل
+COLUMN_ALIASES = {
+    'customer_name': ('customer_name', 'name', 'customer', 'الاسم', 'اسم الزبون', 'الزبون'),
+    'customer_phone': ('customer_phone', 'phone', 'telephone', 'الهاتف', 'رقم الهاتف'),
+    'customer_state': ('customer_state', 'state', 'wilaya', 'الولاية'),
+    'customer_address': ('customer_address', 'address', 'العنوان'),
+    'product_type': ('product_type', 'product', 'المنتج', 'نوع المنتج'),
+    'price': ('price', 'السعر'),
+    'delivery_type': ('delivery_type', 'delivery', 'نوع التوصيل', 'التوصيل'),
+    'delivery_company': ('delivery_company', 'carrier', 'company', 'شركة التوصيل'),
+}
+REQUIRED_FIELDS = ('customer_name', 'customer_phone', 'customer_state', 'customer_address', 'product_type', 'price')
+
+DELIVERY_TYPES = {
+    'home': 'home', 'منزل': 'home', 'المنزل': 'home',
+    'office': 'office', 'مكتب': 'office', 'المكتب': 'office',
+    'free': 'free', 'مجاني': 'free', 'مجانا': 'free',
+}
+DELIVERY_COMPANIES = ('yalidin', 'zr_express')
+
+
+def _header_map(header):
+    aliases = {alias.lower(): field for field, names in COLUMN_ALIASES.items() for alias in names}
+    return [aliases.get(str(name or '').strip().lower()) for name in header]
+
+
+def iter_rows(stream, filename):
+    """قراءة الملف صفاً بصف: يعيد (رقم السطر، {الحقل: القيمة})"""
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('استيراد ملفات XLSX يتطلب مكتبة openpyxl')
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+    elif filename.lower().endswith('.csv'):
+        # codecs بدلاً من io.TextIOWrapper: SpooledTemporaryFile (ملفات werkzeug المرفوعة) ليس فيه
+        # readable() قبل Python 3.11؛ StreamReader يحتاج read() فقط
+        rows = csv.reader(codecs.getreader('utf-8-sig')(stream))
+    else:
+        raise ValueError('نوع الملف غير مدعوم (CSV أو XLSX فقط)')
+
+    header = None
+    for line_number, row in enumerate(rows, start=1):
+        if header is None:
+            header = _header_map(row)
+            missing = [field for field in REQUIRED_FIELDS if field not in header]
+            if missing:
+                raise ValueError(f'أعمدة ناقصة في الملف: {", ".join(missing)}')
+            continue
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield line_number, {field: value for field, value in zip(header, row) if field}
+
+
+def normalize_phone(value):
+    """أرقام الهاتف من Excel تفقد غالباً الصفر الأول أو تحتوي على مسافات"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    phone = ''.join(ch for ch in str(value or '') if ch.isdigit())
+    if len(phone) == 9 and phone[0] in '567':
+        phone = '0' + phone
+    return phone
+
+
+def validate_row(row, is_valid_phone, resolve_wilaya):
+    """يعيد (القيم الجاهزة للإدخال، قائمة الأخطاء)"""
+    errors = []
+    values = {}
+
+    for field in ('customer_name', 'customer_address', 'product_type'):
+        value = str(row.get(field) or '').strip()
+        if not value:
+            errors.append(f'الحقل {field} فارغ')
+        values[field] = value
+
+    phone = normalize_phone(row.get('customer_phone'))
+    if not is_valid_phone(phone):
+        errors.append('رقم الهاتف غير صحيح')
+    values['customer_phone'] = phone
+
+    state = resolve_wilaya(row.get('customer_state'))
+    if not state:
+        errors.append('الولاية غير معروفة')
+    values['customer_state'] = state
+
+    try:
+        values['price'] = float(row.get('price'))
+        if values['price'] < 0:
+            errors.append('السعر لا يمكن أن يكون سالباً')
+    except (TypeError, ValueError):
+        errors.append('السعر غير صحيح')
+
+    delivery_type = str(row.get('delivery_type') or 'home').strip().lower()
+    values['delivery_type'] = DELIVERY_TYPES.get(delivery_type)
+    if not values['delivery_type']:
+        errors.append('نوع التوصيل غير صحيح')
+
+    company = str(row.get('delivery_company') or '').strip().lower() or None
+    if company and company not in DELIVERY_COMPANIES:
+        errors.append('شركة التوصيل غير معروفة')
+    values['delivery_company'] = company
+
+    return values, errors
+
+
+def import_orders(rows, insert_batch, is_valid_phone, resolve_wilaya, batch_size=1000):
+    """التحقق والإدخال على دفعات؛ يعيد تقريراً بعدد الطلبيات المستوردة وأخطاء كل سطر"""
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def flush(batch):
+        valid = []
+        for line_number, row in batch:
+            values, errors = validate_row(row, is_valid_phone, resolve_wilaya)
+            if errors:
+                report['failed'] += 1
+                report['errors'].append({'row': line_number, 'errors': errors})
+            else:
+                valid.append(values)
+        if valid:
+            insert_batch(valid)
+            report['imported'] += len(valid)
+
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
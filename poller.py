@@ -0,0 +1,101 @@
+"""جدولة التحقق من حالات الطلبيات في الخلفية
+
+يعمل إما داخل عملية التطبيق (STATUS_POLLER=thread) أو كعامل مستقل:
+
+    STATUS_POLLER=worker python poller.py
+
+في الحالتين يأخذ الطلبيات المستحقة من جدول status_poll على دفعات، ويحدثها عبر
+دوال شركات التوصيل، ثم يعيد جدولتها بفاصل زمني عشوائي قليلاً (jitter).
+"""
+import random
+import signal
+import threading
+import time
+
+
+class RateLimiter:
+    """حد أقصى لعدد الطلبات في الثانية لكل شركة توصيل (token bucket)"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def wrap(self, lookup):
+        def limited_lookup(*args, **kwargs):
+            self.acquire()
+            return lookup(*args, **kwargs)
+        return limited_lookup
+
+
+def jittered(seconds, jitter):
+    """الفاصل الزمني مع تغيير عشوائي بنسبة jitter حتى لا تتزامن كل الطلبيات"""
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+
+class StatusPoller(threading.Thread):
+    """حلقة الجدولة: تستدعي poll_once(batch_size) حتى يطلب الإيقاف
+
+    poll_once تعيد عدد الطلبيات التي تمت معالجتها؛ إذا كانت الدفعة ممتلئة نكمل مباشرة،
+    وإلا ننتظر idle_interval قبل المحاولة التالية.
+    """
+
+    def __init__(self, poll_once, batch_size=100, idle_interval=30, jitter=0.2, logger=None):
+        super().__init__(name='status-poller', daemon=True)
+        self.poll_once = poll_once
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.jitter = jitter
+        self.logger = logger
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                processed = self.poll_once(self.batch_size)
+            except Exception:
+                processed = 0
+                if self.logger:
+                    self.logger.exception('فشل في دورة التحقق من حالات الطلبيات')
+            if processed < self.batch_size:
+                self._stop_event.wait(jittered(self.idle_interval, self.jitter))
+
+    def stop(self, timeout=None):
+        """إيقاف آمن: الدفعة الجارية تكتمل وتحفظ قبل الخروج"""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+if __name__ == '__main__':
+    from app import app, create_status_poller
+
+    with app.app_context():
+        poller = create_status_poller()
+
+    def shutdown(signum, frame):
+        app.logger.info('إيقاف عامل التحقق من الحالات...')
+        poller.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    poller.start()
+    while poller.is_alive():
+        poller.join(1)
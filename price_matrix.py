@@ -0,0 +1,150 @@
+"""مصفوفة أسعار التوصيل في الذاكرة
+
+لكل شركة مصفوفتان (منزل/مكتب) مفهرستان برقم الولاية (1..58)، تُحمّل مرة واحدة ثم
+تُحدّث في مكانها عند تعديل الأسعار، فلا يحتاج حساب السعر إلى قاعدة البيانات.
+السعر غير المعروف يخزن كـ NaN ويعاد كـ None.
+
+version هو رقم إصدار الأسعار عند التحميل: إذا اختلف عن الرقم في قاعدة البيانات (تعديل من
+عملية أخرى) يعاد التحميل. حتى لا يقرأ الرقم في كل حساب سعر، كل عملية تستبدل ملفاً صغيراً
+مشتركاً (stamp_path) بعد حفظ الأسعار، والقراء يقارنون هويته (inode + وقت التعديل) كما في
+identity_cache؛ الرقم يقرأ فقط عندما يتغير الملف.
+"""
+import math
+import os
+import threading
+import uuid
+from array import array
+
+WILAYA_COUNT = 58
+DELIVERY_TYPES = ('home', 'office')
+
+
+def _empty_row():
+    return array('d', [math.nan]) * (WILAYA_COUNT + 1)
+
+
+def _value(price):
+    return None if math.isnan(price) else price
+
+
+class PriceMatrix:
+    def __init__(self, stamp_path=None):
+        self._companies = None  # {company_id: {'name', 'image', 'thumbnails', 'home': array, 'office': array}}
+        self.version = None
+        self.stamp_path = stamp_path
+        # هوية ملف الختم عند آخر تحقق من version (تقرأ قبل قراءة قاعدة البيانات)
+        self.stamp = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._companies is not None
+
+    def load(self, companies, prices, version=None):
+        """companies: [(id, name, image, thumbnails)]، prices: [(company_id, wilaya_code, home, office)]"""
+        table = {
+            company_id: {
+                'name': name, 'image': image, 'thumbnails': thumbnails,
+                'home': _empty_row(), 'office': _empty_row()
+            }
+            for company_id, name, image, thumbnails in companies
+        }
+        for company_id, code, home, office in prices:
+            company = table.get(company_id)
+            if company is None or not code or not 1 <= code <= WILAYA_COUNT:
+                continue
+            company['home'][code] = home if home is not None else math.nan
+            company['office'][code] = office if office is not None else math.nan
+        with self._lock:
+            self._companies = table
+            self.version = version
+
+    def read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def touch(self):
+        """إبلاغ العمليات الأخرى بعد حفظ الأسعار (ملف جديد في كل مرة حتى يتغير الـ inode)"""
+        if self.stamp_path:
+            temp_path = f'{self.stamp_path}.{uuid.uuid4().hex}'
+            with open(temp_path, 'w') as f:
+                f.write(str(self.version or ''))
+            os.replace(temp_path, self.stamp_path)
+
+    def invalidate(self):
+        with self._lock:
+            self._companies = None
+            self.version = None
+        self.touch()
+
+    def advance(self, version):
+        """بعد تعديل في مكانه: نعتمد الإصدار الجديد فقط إذا كان التالي مباشرة لما هو محمل،
+        وإلا فقد عدلت عملية أخرى الأسعار بينهما ويعاد التحميل عند الاستعمال التالي
+
+        الختم يتغير في الحالتين، فهذه العملية أيضاً تعيد قراءة الرقم مرة واحدة للتأكد.
+        """
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+        self.touch()
+
+    def set_price(self, company_id, code, home=None, office=None):
+        """تحديث سعر واحد في مكانه (إذا كانت المصفوفة محملة)"""
+        companies = self._companies
+        if companies is None or not code:
+            return
+        company = companies.get(company_id)
+        if company is None:
+            self.invalidate()
+            return
+        if home is not None:
+            company['home'][code] = home
+        if office is not None:
+            company['office'][code] = office
+
+    def set_company(self, company_id, name=None, image=None, thumbnails=None):
+        """thumbnails={} تعني أن نسخ الصورة الجديدة لم تجهز بعد"""
+        companies = self._companies
+        if companies is None:
+            return
+        company = companies.get(company_id)
+        if company is None:
+            self.invalidate()
+            return
+        if name is not None:
+            company['name'] = name
+        if image is not None:
+            company['image'] = image
+        if thumbnails is not None:
+            company['thumbnails'] = thumbnails or None
+
+    def quote(self, code):
+        """أسعار كل الشركات لولاية واحدة"""
+        return [
+            {
+                'company_id': company_id,
+                'company': company['name'],
+                'image': company['image'],
+                'thumbnails': company['thumbnails'],
+                'home': _value(company['home'][code]),
+                'office': _value(company['office'][code]),
+            }
+            for company_id, company in (self._companies or {}).items()
+        ]
+
+    def shipping(self, company_id, code, delivery_type):
+        """سعر التوصيل لشركة وولاية ونوع توصيل؛ None إذا لم يكن معروفاً"""
+        if delivery_type == 'free':
+            return 0.0
+        company = (self._companies or {}).get(company_id)
+        if company is None or delivery_type not in DELIVERY_TYPES:
+            return None
+        return _value(company[delivery_type][code])
+
+    def company_ids(self):
+        return list(self._companies or {})
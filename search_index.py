@@ -0,0 +1,153 @@
+"""فهرس البحث النصي الكامل (SQLite FTS5) للطلبيات
+
+الجدول order_search يحتفظ بنسخة مطبّعة من اسم الزبون، الهاتف، العنوان ونوع المنتج
+برقم الصف نفسه (rowid) الخاص بالطلب، ويتم تحديثه من أحداث ORM في app.py.
+user_id عمود مفهرس أيضاً، فالتاجر جزء من MATCH نفسه (user_id:5 AND ...) ولا تقرأ قوائم
+كلمات التجار الآخرين؛ كلمات البحث تقيد بأعمدة النص فقط.
+"""
+import re
+
+from sqlalchemy import Integer, column, text
+
+SEARCH_TABLE = 'order_search'
+SEARCH_FIELDS = ('customer_name', 'customer_phone', 'customer_address', 'product_type')
+
+# الحركات والتطويل
+_ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه'
+})
+_TOKEN = re.compile(r'\w+')
+
+# حالة توفر الجدول (None = لم يتم التحقق بعد)
+_available = None
+
+
+def normalize(value):
+    """توحيد الكتابة العربية: حذف الحركات وتوحيد أشكال الألف والياء والتاء المربوطة"""
+    if not value:
+        return ''
+    value = _ARABIC_MARKS.sub('', str(value)).translate(_ARABIC_LETTERS)
+    return value.lower()
+
+
+def normalize_document(value):
+    """النص المفهرس: النص المطبّع مع نسخة من الكلمات بدون "ال" التعريف"""
+    value = normalize(value)
+    extra = [word[2:] for word in _TOKEN.findall(value) if word.startswith('ال') and len(word) > 3]
+    return ' '.join([value] + extra) if extra else value
+
+
+def build_match_query(term, user_id=None):
+    """تحويل نص البحث إلى استعلام FTS5: كل كلمة بمطابقة البادئة والكلمات مجتمعة (AND)
+    في أعمدة النص، مع تقييد user_id إذا حدد"""
+    tokens = _TOKEN.findall(normalize(term))
+    if not tokens:
+        return ''
+    words = ' '.join(f'"{token}"*' for token in tokens)
+    match = f'{{{" ".join(SEARCH_FIELDS)}}} : ({words})'
+    return f'user_id : "{int(user_id)}" AND {match}' if user_id is not None else match
+
+
+def is_available(connection):
+    global _available
+    if _available is None:
+        _available = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': SEARCH_TABLE}
+        ).first() is not None
+    return _available
+
+
+def create_search_index(connection):
+    """إنشاء الجدول الافتراضي، ويعيد True إذا تم إنشاؤه الآن (ويجب ملؤه)"""
+    global _available
+    existed = is_available(connection)
+    if existed:
+        sql = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': SEARCH_TABLE}
+        ).scalar() or ''
+        if 'UNINDEXED' in sql:
+            # جدول قديم: user_id غير مفهرس فلا يمكن وضعه في MATCH؛ يعاد إنشاؤه وملؤه
+            connection.execute(text(f'DROP TABLE {SEARCH_TABLE}'))
+            existed = False
+    try:
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "customer_name, customer_phone, customer_address, product_type, user_id, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+    except Exception:
+        # نسخة SQLite بدون FTS5: البحث يرجع إلى LIKE
+        _available = False
+        return False
+    if not existed:
+        # الترتيب حسب الصلة لا يحسب user_id (نفس القيمة في كل طلبيات التاجر)
+        connection.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(1.0, 1.0, 1.0, 1.0, 0.0)')"
+        ))
+    _available = True
+    return not existed
+
+
+def index_order(connection, order_id, user_id, values):
+    if not is_available(connection):
+        return
+    connection.execute(text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :id'), {'id': order_id})
+    params = {field: normalize_document(values.get(field)) for field in SEARCH_FIELDS}
+    params.update(id=order_id, user_id=user_id)
+    connection.execute(text(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, customer_name, customer_phone, customer_address, product_type, user_id) '
+        'VALUES (:id, :customer_name, :customer_phone, :customer_address, :product_type, :user_id)'
+    ), params)
+
+
+def remove_order(connection, order_id):
+    if is_available(connection):
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :id'), {'id': order_id})
+
+
+def _index_from_orders(connection, where='', params=None):
+    connection.connection.create_function('normalize_document', 1, normalize_document)
+    connection.execute(text(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, customer_name, customer_phone, customer_address, product_type, user_id) '
+        'SELECT id, normalize_document(customer_name), normalize_document(customer_phone), '
+        f'normalize_document(customer_address), normalize_document(product_type), user_id FROM "order" {where}'
+    ), params or {})
+
+
+def rebuild_search_index(connection):
+    """إعادة بناء الفهرس بالكامل من جدول الطلبيات"""
+    if not is_available(connection):
+        return
+    connection.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+    _index_from_orders(connection)
+
+
+def index_orders_after(connection, last_id):
+    """فهرسة الطلبيات المدخلة جماعياً (كل الطلبيات التي رقمها أكبر من last_id)"""
+    if is_available(connection):
+        _index_from_orders(connection, 'WHERE id > :last_id', {'last_id': last_id})
+
+
+def search_order_ids(connection, user_id, term, limit, offset=0):
+    """أرقام الطلبيات المطابقة مرتبة حسب الصلة (bm25)"""
+    match = build_match_query(term, user_id)
+    if not match:
+        return []
+    rows = connection.execute(text(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match '
+        'ORDER BY rank LIMIT :limit OFFSET :offset'
+    ), {'match': match, 'limit': limit, 'offset': offset})
+    return [row[0] for row in rows]
+
+
+def matching_ids(user_id, term):
+    """استعلام فرعي لأرقام الطلبيات المطابقة (لاستعماله في Order.id.in_(...))، أو None"""
+    match = build_match_query(term, user_id)
+    if not match:
+        return None
+    return text(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :search_match'
+    ).bindparams(search_match=match).columns(column('rowid', Integer))
@@ -0,0 +1,62 @@
+"""إعدادات SQLite لكل اتصال وإعداد مجمع الاتصالات
+
+PROFILES['production']: وضع WAL (القراء لا ينتظرون الكاتب)، busy_timeout بدلاً من الخطأ
+"database is locked" الفوري، synchronous=NORMAL (آمن مع WAL)، وذاكرة mmap/cache أكبر.
+PROFILES['default']: إعدادات SQLite الافتراضية (للمقارنة في bench_sqlite.py).
+
+وضع WAL يحفظ في ملف قاعدة البيانات نفسه؛ باقي الإعدادات تطبق على كل اتصال جديد.
+"""
+from sqlalchemy.pool import QueuePool
+
+PROFILES = {
+    'production': {
+        'busy_timeout': 5000,  # بالميلي ثانية
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # القيمة السالبة بالكيلوبايت (64 ميغابايت)
+        'temp_store': 'MEMORY',
+    },
+    'default': {
+        'journal_mode': 'DELETE',
+    },
+}
+
+
+def sqlite_pragmas(profile='production', **overrides):
+    """إعدادات الملف الشخصي مع استبدال القيم المحددة (القيمة None تحذف الإعداد)"""
+    if profile not in PROFILES:
+        raise ValueError(f'ملف إعدادات SQLite غير معروف: {profile}')
+    pragmas = dict(PROFILES[profile])
+    pragmas.update(overrides)
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """تطبيق الإعدادات على اتصال sqlite3 (busy_timeout أولاً حتى ينتظر تغيير journal_mode)"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if 'busy_timeout' in pragmas:
+            cursor.execute(f'PRAGMA busy_timeout = {int(pragmas["busy_timeout"])}')
+        for name, value in pragmas.items():
+            if name != 'busy_timeout':
+                cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def engine_options(pragmas, pool_size=5, max_overflow=10, pool_timeout=30):
+    """خيارات create_engine لملف SQLite
+
+    SQLAlchemy 1.4 يستعمل NullPool لملفات SQLite (اتصال جديد وإعدادات من جديد في كل طلب)؛
+    هنا نحتفظ بالاتصالات في مجمع لكل عملية. الاتصال ينتقل بين خيوط الخادم لذلك
+    check_same_thread=False، وكل اتصال يستعمله خيط واحد في كل مرة.
+    """
+    timeout = int(pragmas.get('busy_timeout', 5000)) / 1000
+    return {
+        'poolclass': QueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'connect_args': {'timeout': timeout, 'check_same_thread': False},
+    }
@@ -0,0 +1,288 @@
+"""اختبارات التطبيق على قاعدة بيانات مؤقتة (الملخص اليومي، ترقيم الصفحات، الاستعادة، الترقية)
+
+    python -m unittest discover tests
+
+ORDERS_DB يحدد قبل استيراد app (كما في benchmark.py)، فلا تلمس الاختبارات orders.db.
+كل صنف يعمل بمستخدم خاص به حتى لا تختلط بياناته مع الأصناف الأخرى.
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp(prefix='orders-tests-')
+os.environ['ORDERS_DB'] = os.path.join(WORKDIR, 'orders.db')
+
+from sqlalchemy import select  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import app as orders_app  # noqa: E402
+from app import app, db, Order, DailyRevenue, DeliveryPrice, User  # noqa: E402
+
+PASSWORD = 'password'
+
+
+def setUpModule():
+    app.config['TESTING'] = True
+    with app.app_context():
+        orders_app.init_db()
+
+
+def tearDownModule():
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+def create_user(username):
+    with app.app_context():
+        user = User(username=username, password=generate_password_hash(PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def login(username):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    assert response.status_code == 302, response.status_code
+    return client
+
+
+def new_order(user_id, **values):
+    order = Order(
+        user_id=user_id,
+        customer_name=values.pop('customer_name', 'محمد أمين'),
+        customer_phone=values.pop('customer_phone', '0555123456'),
+        customer_state=values.pop('customer_state', 'Alger'),
+        customer_address=values.pop('customer_address', 'حي الجزائر'),
+        product_type=values.pop('product_type', 'حذاء'),
+        price=values.pop('price', 1000.0),
+        delivery_type=values.pop('delivery_type', 'home'),
+        status=values.pop('status', 'pending'),
+        **values
+    )
+    db.session.add(order)
+    return order
+
+
+def rollup_rows(user_id):
+    """صفوف الملخص اليومي للمستخدم بدون الصفوف الفارغة (الفروقات قد تترك صفاً بعدد 0)"""
+    table = DailyRevenue.__table__
+    rows = db.session.execute(select(
+        table.c.day, table.c.status, table.c.delivery_type, table.c.order_count, table.c.revenue
+    ).where(table.c.user_id == user_id, table.c.order_count != 0)).all()
+    return sorted((day, status, delivery_type, count, round(revenue, 6))
+                  for day, status, delivery_type, count, revenue in rows)
+
+
+class DailyRevenueTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user_id = create_user('rollup')
+        cls.client = login('rollup')
+
+    def test_incremental_rollup_matches_rebuild(self):
+        yesterday = datetime.now() - timedelta(days=1)
+        with app.app_context():
+            orders = [
+                new_order(self.user_id, price=1000),
+                new_order(self.user_id, price=2500, delivery_type='office'),
+                new_order(self.user_id, price=700, created_at=yesterday),
+                new_order(self.user_id, price=300, delivery_type='free', status='processing'),
+            ]
+            db.session.commit()
+            order_ids = [order.id for order in orders]
+
+            # تعديل عبر ORM: السعر والحالة ونوع التوصيل واليوم، ثم حذف طلب
+            orders[0].price = 1200
+            orders[1].status = 'delivered'
+            orders[2].delivery_type = 'office'
+            orders[3].created_at = yesterday - timedelta(days=1)
+            db.session.commit()
+            db.session.delete(orders[3])
+            db.session.commit()
+
+        # تحديث جماعي (بدون أحداث ORM)
+        response = self.client.post('/update_status_bulk', json={
+            'statuses': {str(order_ids[0]): 'returned', str(order_ids[2]): 'delivered'}
+        })
+        self.assertTrue(response.get_json()['success'])
+
+        with app.app_context():
+            incremental = rollup_rows(self.user_id)
+            orders_app.rebuild_daily_revenue(self.user_id)
+            self.assertEqual(incremental, rollup_rows(self.user_id))
+            self.assertEqual(sum(row[3] for row in incremental), 3)
+
+
+class PaginationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user_id = create_user('pages')
+
+    def test_cursor_breaks_ties_by_id(self):
+        created_at = datetime(2024, 5, 1, 12, 0, 0)
+        with app.app_context():
+            for index in range(7):
+                new_order(self.user_id, customer_name=f'زبون {index}', created_at=created_at)
+            new_order(self.user_id, created_at=created_at + timedelta(seconds=1))
+            db.session.commit()
+            expected = [order_id for order_id, in db.session.query(Order.id).filter(
+                Order.user_id == self.user_id
+            ).order_by(Order.created_at.desc(), Order.id.desc())]
+
+            seen, cursor = [], None
+            while True:
+                page, cursor = orders_app.paginate_orders(
+                    Order.query.filter(Order.user_id == self.user_id), cursor, per_page=3
+                )
+                seen.extend(order.id for order in page)
+                if not cursor:
+                    break
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 8)
+
+
+class BulkStatusTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user_id = create_user('bulk')
+        cls.other_id = create_user('bulk-other')
+        cls.client = login('bulk')
+
+    def test_per_id_results(self):
+        with app.app_context():
+            own, other = new_order(self.user_id), new_order(self.other_id)
+            db.session.commit()
+            own_id, other_id = own.id, other.id
+        missing_id = other_id + 1000
+
+        response = self.client.post('/update_status_bulk', json={
+            'order_ids': [own_id, other_id, missing_id], 'status': 'delivered'
+        })
+        results = response.get_json()['results']
+
+        self.assertTrue(results[str(own_id)]['success'])
+        self.assertEqual(results[str(own_id)]['status'], 'delivered')
+        self.assertFalse(results[str(other_id)]['success'])
+        self.assertFalse(results[str(missing_id)]['success'])
+        with app.app_context():
+            self.assertEqual(db.session.get(Order, own_id).status, 'delivered')
+            self.assertEqual(db.session.get(Order, other_id).status, 'pending')
+
+    def test_invalid_status_changes_nothing(self):
+        with app.app_context():
+            order = new_order(self.user_id)
+            db.session.commit()
+            order_id = order.id
+
+        response = self.client.post('/update_status_bulk', json={'order_ids': [order_id], 'status': 'lost'})
+
+        self.assertFalse(response.get_json()['success'])
+        with app.app_context():
+            self.assertEqual(db.session.get(Order, order_id).status, 'pending')
+
+
+class PriceGridTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        create_user('prices')
+        cls.client = login('prices')
+
+    def test_stale_version_is_rejected(self):
+        grid = self.client.get('/delivery_prices/grid?format=json').get_json()
+        company_id = grid['companies'][0]['company_id']
+        version = grid['version']
+
+        first = self.client.post('/delivery_prices/grid', json={
+            'company_id': company_id, 'version': version, 'prices': [{'wilaya': 16, 'home': 650}]
+        })
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.get_json()['version'], version + 1)
+
+        # نفس الرقم القديم: تعديل من مكان آخر حصل بعد تحميل الجدول
+        stale = self.client.post('/delivery_prices/grid', json={
+            'company_id': company_id, 'version': version, 'prices': [{'wilaya': 16, 'home': 900}]
+        })
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.get_json()['version'], version + 1)
+
+        with app.app_context():
+            price = DeliveryPrice.query.filter_by(company_id=company_id, wilaya_code=16).one()
+            self.assertEqual(price.home_delivery_price, 650)
+            quote = {row['company_id']: row for row in orders_app.get_price_matrix().quote(16)}
+            self.assertEqual(quote[company_id]['home'], 650)
+
+
+class RestoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user_id = create_user('restore')
+
+    def test_failed_restore_leaves_database_untouched(self):
+        with app.app_context():
+            new_order(self.user_id, customer_name='قبل الاستعادة')
+            db.session.commit()
+            backup_path = os.path.join(WORKDIR, 'broken.jsonl.gz')
+            orders_app.serialize_data(backup_path)
+            before_orders = db.session.query(Order.id, Order.customer_name, Order.status).order_by(Order.id).all()
+            before_users = db.session.query(User.id, User.username).order_by(User.id).all()
+
+        # صف مكرر في آخر الملف: يفشل الإدخال بعد تحميل كل الصفوف السابقة في القاعدة المؤقتة
+        with gzip.open(backup_path, 'rt', encoding='utf-8') as f:
+            lines = f.readlines()
+        duplicate = next(line for line in lines if json.loads(line).get('table') == 'order')
+        with gzip.open(backup_path, 'wt', encoding='utf-8') as f:
+            f.writelines(lines + [duplicate])
+
+        with app.app_context():
+            with self.assertRaises(Exception):
+                orders_app.deserialize_data(backup_path)
+            db.session.remove()
+            self.assertEqual(
+                db.session.query(Order.id, Order.customer_name, Order.status).order_by(Order.id).all(),
+                before_orders
+            )
+            self.assertEqual(db.session.query(User.id, User.username).order_by(User.id).all(), before_users)
+        self.assertFalse(os.path.exists(orders_app.db_path + '.restore'))
+
+
+class MigrationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user_id = create_user('migration')
+
+    @staticmethod
+    def schema():
+        return db.session.execute(db.text(
+            "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        )).all()
+
+    def test_upgrade_schema_is_idempotent(self):
+        with app.app_context():
+            new_order(self.user_id, status='delivered')
+            db.session.commit()
+            schema = self.schema()
+            rollup = rollup_rows(self.user_id)
+            order_count = Order.query.count()
+
+            orders_app.upgrade_schema()
+            self.assertFalse(orders_app.convert_enum_columns())
+            orders_app.upgrade_schema()
+
+            self.assertEqual(self.schema(), schema)
+            self.assertEqual(rollup_rows(self.user_id), rollup)
+            self.assertEqual(Order.query.count(), order_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
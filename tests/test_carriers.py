@@ -0,0 +1,153 @@
+"""refresh_statuses مع شركة توصيل وهمية عبر HTTP محلي
+
+    python -m unittest discover tests
+
+الخادم الوهمي فيه ثلاثة مسارات: /ok (رد فوري)، /slow (يتأخر SLOW_DELAY ثانية) و/fail (خطأ 500)،
+ويسجل أكبر عدد من الطلبات المتزامنة حتى نتحقق من حد التوازي.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carriers import StatusJob, refresh_statuses  # noqa: E402
+
+SLOW_DELAY = 1.0
+OK_DELAY = 0.05
+
+
+class StubCarrier(BaseHTTPRequestHandler):
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            path, _, tracking_number = self.path.strip('/').partition('/')
+            if path == 'fail':
+                self.send_response(500)
+                self.end_headers()
+                return
+            time.sleep(SLOW_DELAY if path == 'slow' else OK_DELAY)
+            body = json.dumps({'tracking': tracking_number, 'status': 'delivered'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # العميل أغلق الاتصال بعد انتهاء مهلته
+            pass
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def http_lookup(base_url, path, timeout):
+    """دالة استعلام كما تكتب لشركة حقيقية: طلب HTTP بمهلة لكل استدعاء"""
+    def lookup(tracking_number):
+        with urllib.request.urlopen(f'{base_url}/{path}/{tracking_number}', timeout=timeout) as response:
+            data = json.load(response)
+        return {'status': 'success', 'delivery_status': data['status']}
+    return lookup
+
+
+class RefreshStatusesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCarrier)
+        cls.server.daemon_threads = True
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        # طلبات /slow من اختبار سابق (انتهت مهلتها عند العميل) قد تكون ما زالت في الخادم
+        deadline = time.monotonic() + SLOW_DELAY * 2
+        while StubCarrier.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        StubCarrier.max_in_flight = 0
+
+    def test_concurrency_is_bounded(self):
+        jobs = [StatusJob(order_id, 'fast', f'T{order_id}') for order_id in range(20)]
+        lookups = {'fast': http_lookup(self.base_url, 'ok', timeout=5)}
+
+        started = time.perf_counter()
+        results = refresh_statuses(jobs, lookups, max_workers=4, timeout=10)
+        duration = time.perf_counter() - started
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(result['status'] == 'success' for result in results.values()))
+        self.assertLessEqual(StubCarrier.max_in_flight, 4)
+        self.assertGreater(StubCarrier.max_in_flight, 1)
+        # 20 طلباً × 50ms على 4 خيوط ≈ 0.25s، وبالتسلسل 1s
+        self.assertLess(duration, 20 * OK_DELAY)
+
+    def test_per_call_timeout(self):
+        jobs = [StatusJob(1, 'slow', 'S1'), StatusJob(2, 'fast', 'F1')]
+        lookups = {
+            'slow': http_lookup(self.base_url, 'slow', timeout=0.2),
+            'fast': http_lookup(self.base_url, 'ok', timeout=5),
+        }
+
+        started = time.perf_counter()
+        results = refresh_statuses(jobs, lookups, max_workers=4, timeout=10)
+        duration = time.perf_counter() - started
+
+        self.assertEqual(results[1]['status'], 'error')
+        self.assertEqual(results[2], {'status': 'success', 'delivery_status': 'delivered'})
+        self.assertLess(duration, SLOW_DELAY)
+
+    def test_batch_timeout_does_not_wait_for_stuck_calls(self):
+        jobs = [StatusJob(1, 'slow', 'S1'), StatusJob(2, 'fast', 'F1')]
+        lookups = {
+            'slow': http_lookup(self.base_url, 'slow', timeout=5),
+            'fast': http_lookup(self.base_url, 'ok', timeout=5),
+        }
+
+        started = time.perf_counter()
+        results = refresh_statuses(jobs, lookups, max_workers=4, timeout=0.3)
+        duration = time.perf_counter() - started
+
+        self.assertEqual(results[1]['status'], 'error')
+        self.assertEqual(results[2]['status'], 'success')
+        self.assertLess(duration, SLOW_DELAY)
+
+    def test_failing_carrier_does_not_block_others(self):
+        jobs = [StatusJob(order_id, 'broken' if order_id % 2 else 'fast', f'T{order_id}') for order_id in range(10)]
+        lookups = {
+            'broken': http_lookup(self.base_url, 'fail', timeout=5),
+            'fast': http_lookup(self.base_url, 'ok', timeout=5),
+            'missing': 'بيانات API غير مكتملة',
+        }
+        jobs.append(StatusJob(99, 'missing', 'M1'))
+
+        results = refresh_statuses(jobs, lookups, max_workers=3, timeout=10)
+
+        for order_id in range(10):
+            expected = 'error' if order_id % 2 else 'success'
+            self.assertEqual(results[order_id]['status'], expected, order_id)
+        self.assertIn('500', results[1]['message'])
+        self.assertEqual(results[99], {'status': 'error', 'message': 'بيانات API غير مكتملة'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""نسخ مصغرة للصور المرفوعة (صورة الملف الشخصي وصور شركات التوصيل)
+
+كل صورة أصلية تعطي نسخة لكل حجم في SIZES بصيغتي WebP وJPEG. اسم كل نسخة فيه بصمة
+محتواها (company_3_128_9f2c1a7b04d6e5f1.webp)، فيمكن للمتصفح حفظها لمدة طويلة: صورة جديدة
+تعني اسماً جديداً. التحويل بطيء نسبياً (Pillow) لذلك يتم في خيط ThumbnailWorker بعد الرد
+على طلب الرفع، والصفحات تعرض الصورة الأصلية حتى تجهز النسخ.
+"""
+import hashlib
+import io
+import os
+import queue
+import threading
+
+# أطوال الضلع الأكبر بالبكسل (الصورة لا تكبر إذا كانت أصغر)
+SIZES = (64, 128, 256)
+# (الامتداد، صيغة Pillow، خيارات الحفظ)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def pillow_available():
+    try:
+        import PIL
+    except ImportError:
+        return False
+    return True
+
+
+def variant_files(manifest):
+    """أسماء كل الملفات في {size: {extension: filename}}"""
+    return {filename for formats in (manifest or {}).values() for filename in formats.values()}
+
+
+def _open_image(source, max_size):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        # JPEG: فك الضغط مباشرة بدقة أقل (1/2 إلى 1/8) بدلاً من فك صورة الهاتف كاملة
+        image.draft('RGB', (max_size * 2, max_size * 2))
+        image = ImageOps.exif_transpose(image)
+        transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        return image.convert('RGBA' if transparent else 'RGB')
+
+
+def _flatten(image):
+    """JPEG بدون شفافية: الخلفية بيضاء"""
+    from PIL import Image
+
+    if image.mode == 'RGB':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _write(path, data):
+    # كتابة في ملف مؤقت ثم rename حتى لا يقرأ أحد ملفاً ناقصاً
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def make_thumbnails(source, folder, prefix, sizes=SIZES):
+    """إنشاء النسخ في folder وإرجاع {size: {extension: filename}} (المفاتيح نصوص لأنها تحفظ JSON)"""
+    from PIL import Image
+
+    image = _open_image(source, max(sizes))
+    manifest = {}
+    for size in sizes:
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+        formats = {}
+        for extension, image_format, options in FORMATS:
+            buffer = io.BytesIO()
+            (variant if image_format == 'WEBP' else _flatten(variant)).save(buffer, image_format, **options)
+            data = buffer.getvalue()
+            filename = f'{prefix}_{size}_{hashlib.sha256(data).hexdigest()[:16]}.{extension}'
+            path = os.path.join(folder, filename)
+            if not os.path.exists(path):
+                _write(path, data)
+            formats[extension] = filename
+        manifest[str(size)] = formats
+    return manifest
+
+
+def collect_garbage(folder, prefix, keep):
+    """حذف نسخ prefix القديمة (كل ملف يبدأ بـ prefix_ وليس في keep)؛ يعيد عدد الملفات المحذوفة"""
+    removed = 0
+    for filename in os.listdir(folder):
+        if filename.startswith(f'{prefix}_') and filename not in keep:
+            try:
+                os.remove(os.path.join(folder, filename))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+class ThumbnailWorker:
+    """طابور مهام في الذاكرة يعالجه خيط واحد
+
+    الخيط يبدأ عند أول مهمة (وليس عند الاستيراد)، فكل عامل gunicorn بعد fork يشغل
+    خيطه الخاص لما يرفع إليه. process(*job) تستدعى لكل مهمة بالترتيب.
+    """
+
+    def __init__(self, process, logger=None):
+        self.process = process
+        self.logger = logger
+        self.processed = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, *job):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='thumbnails', daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self.process(*job)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                if self.logger:
+                    self.logger.exception('فشل في إنشاء الصور المصغرة %s', job)
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """انتظار انتهاء كل المهام الموجودة في الطابور"""
+        self._queue.join()
+
+    def stats(self):
+        return {'pending': self._queue.qsize(), 'processed': self.processed, 'failed': self.failed}
@@ -1,83 +1,79 @@
-ALGERIA_WILAYAS = [
-    "01 - أدرار",
-    "02 - الشلف",
-    "03 - الأغواط",
-    "04 - أم البواقي",
-    "05 - باتنة",
-    "06 - بجاية",
-    "07 - بسكرة",
-    "08 - بشار",
-    "09 - البليدة",
-    "10 - البويرة",
-    "11 - تمنراست",
-    "12 - تبسة",
-    "13 - تلمسان",
-    "14 - تيارت",
-    "15 - تيزي وزو",
-    "16 - الجزائر",
-    "17 - الجلفة",
-    "18 - جيجل",
-    "19 - سطيف",
-    "20 - سعيدة",
-    "21 - سكيكدة",
-    "22 - سيدي بلعباس",
-    "23 - عنابة",
-    "24 - قالمة",
-    "25 - قسنطينة",
-    "26 - المدية",
-    "27 - مستغانم",
-    "28 - المسيلة",
-    "29 - معسكر",
-    "30 - ورقلة",
-    "31 - وهران",
-    "32 - البيض",
-    "33 - إليزي",
-    "34 - برج بوعريريج",
-    "35 - بومرداس",
-    "36 - الطارف",
-    "37 - تندوف",
-    "38 - تيسمسيلت",
-    "39 - الوادي",
-    "40 - خنشلة",
-    "41 - سوق أهراس",
-    "42 - تيبازة",
-    "43 - ميلة",
-    "44 - عين الدفلى",
-    "45 - النعامة",
-    "46 - عين تموشنت",
-    "47 - غرداية",
-    "48 - غليزان",
-    "49 - تيميمون",
-    "50 - برج باجي مختار",
-    "51 - أولاد جلال",
-    "52 - بني عباس",
-    "53 - عين صالح",
-    "54 - عين قزام",
-    "55 - تقرت",
-    "56 - جانت",
-    "57 - المغير",
-    "58 - المنيعة"
+# Canonical wilaya list: (code, Arabic name, Latin name).
+# Orders and delivery prices reference wilayas by code (see the Wilaya model in app.py).
+WILAYAS = [
+    (1, 'أدرار', 'Adrar'),
+    (2, 'الشلف', 'Chlef'),
+    (3, 'الأغواط', 'Laghouat'),
+    (4, 'أم البواقي', 'Oum El Bouaghi'),
+    (5, 'باتنة', 'Batna'),
+    (6, 'بجاية', 'Béjaïa'),
+    (7, 'بسكرة', 'Biskra'),
+    (8, 'بشار', 'Béchar'),
+    (9, 'البليدة', 'Blida'),
+    (10, 'البويرة', 'Bouira'),
+    (11, 'تمنراست', 'Tamanrasset'),
+    (12, 'تبسة', 'Tébessa'),
+    (13, 'تلمسان', 'Tlemcen'),
+    (14, 'تيارت', 'Tiaret'),
+    (15, 'تيزي وزو', 'Tizi Ouzou'),
+    (16, 'الجزائر', 'Alger'),
+    (17, 'الجلفة', 'Djelfa'),
+    (18, 'جيجل', 'Jijel'),
+    (19, 'سطيف', 'Sétif'),
+    (20, 'سعيدة', 'Saïda'),
+    (21, 'سكيكدة', 'Skikda'),
+    (22, 'سيدي بلعباس', 'Sidi Bel Abbès'),
+    (23, 'عنابة', 'Annaba'),
+    (24, 'قالمة', 'Guelma'),
+    (25, 'قسنطينة', 'Constantine'),
+    (26, 'المدية', 'Médéa'),
+    (27, 'مستغانم', 'Mostaganem'),
+    (28, 'المسيلة', "M'Sila"),
+    (29, 'معسكر', 'Mascara'),
+    (30, 'ورقلة', 'Ouargla'),
+    (31, 'وهران', 'Oran'),
+    (32, 'البيض', 'El Bayadh'),
+    (33, 'إليزي', 'Illizi'),
+    (34, 'برج بوعريريج', 'Bordj Bou Arréridj'),
+    (35, 'بومرداس', 'Boumerdès'),
+    (36, 'الطارف', 'El Tarf'),
+    (37, 'تندوف', 'Tindouf'),
+    (38, 'تيسمسيلت', 'Tissemsilt'),
+    (39, 'الوادي', 'El Oued'),
+    (40, 'خنشلة', 'Khenchela'),
+    (41, 'سوق أهراس', 'Souk Ahras'),
+    (42, 'تيبازة', 'Tipaza'),
+    (43, 'ميلة', 'Mila'),
+    (44, 'عين الدفلى', 'Aïn Defla'),
+    (45, 'النعامة', 'Naâma'),
+    (46, 'عين تموشنت', 'Aïn Témouchent'),
+    (47, 'غرداية', 'Ghardaïa'),
+    (48, 'غليزان', 'Relizane'),
+    (49, 'تيميمون', 'Timimoun'),
+    (50, 'برج باجي مختار', 'Bordj Badji Mokhtar'),
+    (51, 'أولاد جلال', 'Ouled Djellal'),
+    (52, 'بني عباس', 'Béni Abbès'),
+    (53, 'عين صالح', 'In Salah'),
+    (54, 'عين قزام', 'In Guezzam'),
+    (55, 'تقرت', 'Touggourt'),
+    (56, 'جانت', 'Djanet'),
+    (57, 'المغير', "El M'Ghair"),
+    (58, 'المنيعة', 'El Meniaa'),
 ]
 
+# "NN - name" labels, as shown in forms and stored in delivery_prices.wilaya
+ALGERIA_WILAYAS = [f'{code:02d} - {name_ar}' for code, name_ar, _ in WILAYAS]
+
 def initialize_wilaya_prices():
     """Initialize delivery prices for all wilayas if they don't exist"""
-    from app import db, Company, DeliveryPrice
-    
-    # Get all companies
-    companies = Company.query.all()
-    
-    for company in companies:
-        existing_wilayas = set(price.wilaya for price in company.prices)
-        
-        # Add missing wilayas
-        for wilaya in ALGERIA_WILAYAS:
-            if wilaya not in existing_wilayas:
-                new_price = DeliveryPrice(
-                    company_id=company.id,
-                    wilaya=wilaya,
-                    home_delivery_price=0.0,
-                    office_delivery_price=0.0
-                )
-                db.session.add(new_price)
+    from app import db, Company, upsert_delivery_prices, price_matrix
     
+    # One batched INSERT ... ON CONFLICT for all companies; existing prices are kept
+    rows = [
+        {'company_id': company_id, 'wilaya_code': code, 'home': None, 'office': None}
+        for company_id, in db.session.query(Company.id)
+        for code, _, _ in WILAYAS
+    ]
+    upsert_delivery_prices(db.session.connection(), rows)
     db.session.commit()
+    price_matrix.invalidate()